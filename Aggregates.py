@@ -0,0 +1,212 @@
+import sqlite3
+import bisect
+import regex
+import math
+import csv
+import sys
+import os
+
+import GPUIndex
+
+''' Settings '''
+price_bins = [0, 0.01, 5, 10, 20, 30, 40, 60] # Lower edges of the price bins in the store's currency, the first bin is "free"
+performance_bin_size = 1.0 # Width of the GPU performance bins (GPUIndex.py scale 1 - 10)
+
+'''
+Summary tables ("cubes") of the scraped games by genre, updated incrementally while the scraper
+writes rows, so the usual analysis questions (games per genre, mean rating per genre, price / release
+year / GPU performance distributions per genre) are answered from a few thousand cells instead of
+scanning the whole dataset.
+Every cell is (slot, genre, dimension, bin) with the number of games, the number of ratings and their sum.
+slot is "Genre 1", "Genre 2", "Any" (a game counts once for each of its genres) or "All" (every game, genre ""), dimension is "all"
+(bin 0), "price", "year", "performance" or "performance_amd" (recommended GPU, see GPUIndex.py).
+Games that are written again replace their old contribution, so the cells always describe the newest row
+of every game.
+
+The cubes are an output sink of SteamScraper (output_sinks = { "aggregates" : "SteamData.cubes.sqlite" }),
+and can be (re)built from an existing csv file:
+
+    python Aggregates.py build SteamData.csv SteamData.cubes.sqlite
+    python Aggregates.py show SteamData.cubes.sqlite
+'''
+
+slots = ("Genre 1", "Genre 2", "Any", "All")
+dimensions = ("all", "price", "year", "performance", "performance_amd")
+year_regex = regex.compile(r"\b(19[7-9][0-9]|2[0-9]{3})\b")
+
+def connect(path : str):
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.executescript('''
+        CREATE TABLE IF NOT EXISTS cells (slot TEXT, genre TEXT, dimension TEXT, bin REAL, games INTEGER, ratings INTEGER, rating_sum REAL,
+                                          PRIMARY KEY (slot, genre, dimension, bin)) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS apps (app_id TEXT PRIMARY KEY, genre1 TEXT, genre2 TEXT, rating REAL, price REAL, year INTEGER,
+                                         performance REAL, performance_amd REAL);
+    ''')
+    return connection
+
+# ----------------------------------------
+
+def parse_float(text : str):
+    try:
+        return float(text.replace(",", "")) if text else None
+    except ValueError:
+        return None
+
+def get_facts(row : dict):
+    '''
+    The values of a csv row (as a dict of column name -> string) that the cubes need:
+    (genre1, genre2, rating, price, year, performance, performance_amd), None where unknown.
+    '''
+    year = year_regex.search(row.get("Release date", ""))
+    return (row.get("Genre 1") or None, row.get("Genre 2") or None, parse_float(row.get("Rating", "")), parse_float(row.get("Price", "")),
+            int(year.group()) if year != None else None,
+            GPUIndex.resolve(row.get("Rec Graphics NVIDIA", "")), GPUIndex.resolve(row.get("Rec Graphics AMD", "")))
+
+def get_bins(facts : tuple):
+    '''
+    The (dimension, bin) pairs a game falls into.
+    '''
+    _, _, _, price, year, performance, performance_amd = facts
+    bins = [("all", 0)]
+    if price != None:
+        bins.append(("price", price_bins[max(0, bisect.bisect_right(price_bins, price) - 1)]))
+    if year != None:
+        bins.append(("year", year))
+    if performance != None:
+        bins.append(("performance", math.floor(performance / performance_bin_size) * performance_bin_size))
+    if performance_amd != None:
+        bins.append(("performance_amd", math.floor(performance_amd / performance_bin_size) * performance_bin_size))
+    return bins
+
+def add_contribution(deltas : dict, facts : tuple, sign : int):
+    '''
+    Adds (sign 1) or removes (sign -1) the contribution of one game to deltas, { cell key : [games, ratings, rating_sum] }.
+    '''
+    genre1, genre2, rating = facts[0], facts[1], facts[2]
+    genres = [("Genre 1", genre1), ("Genre 2", genre2), ("All", "")] + [("Any", genre) for genre in dict.fromkeys((genre1, genre2))]
+    for (slot, genre) in genres:
+        if genre == None:
+            continue
+        for (dimension, bin) in get_bins(facts):
+            delta = deltas.setdefault((slot, genre, dimension, bin), [0, 0, 0.0])
+            delta[0] += sign
+            if rating != None:
+                delta[1] += sign
+                delta[2] += sign * rating
+
+def update(connection : sqlite3.Connection, rows : list[dict]):
+    '''
+    Adds rows to the cubes. A game that is already in the cubes (by app ID) replaces its old contribution.
+    '''
+    facts = {} # app_id -> facts, the last row of a game wins
+    for row in rows:
+        facts[row["App ID"]] = get_facts(row)
+    deltas = {}
+    app_ids = list(facts)
+    for i in range(0, len(app_ids), 500): # SQLite limits the number of parameters
+        chunk = app_ids[i:i + 500]
+        for (app_id, *old_facts) in connection.execute(f"SELECT * FROM apps WHERE app_id IN ({','.join('?' * len(chunk))})", chunk):
+            add_contribution(deltas, tuple(old_facts), -1)
+    for app_facts in facts.values():
+        add_contribution(deltas, app_facts, 1)
+    connection.executemany('''INSERT INTO cells (slot, genre, dimension, bin, games, ratings, rating_sum) VALUES (?, ?, ?, ?, ?, ?, ?)
+                              ON CONFLICT DO UPDATE SET games = games + excluded.games, ratings = ratings + excluded.ratings, rating_sum = rating_sum + excluded.rating_sum''',
+                           [(*key, *delta) for (key, delta) in deltas.items() if delta != [0, 0, 0.0]])
+    connection.executemany("INSERT OR REPLACE INTO apps VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [(app_id, *app_facts) for (app_id, app_facts) in facts.items()])
+    connection.execute("DELETE FROM cells WHERE games = 0")
+    connection.commit()
+
+class AggregateSink:
+    '''
+    Output sink (see OutputSinks.py) that updates the cubes with every batch of rows.
+    '''
+
+    def __init__(self, path : str, column_names : list[str], csv_path : str):
+        self.path = path
+        self.column_names = column_names
+        self.csv_path = csv_path
+        self.connection = None
+
+    def open(self, fresh : bool):
+        rebuild = not fresh and not os.path.exists(self.path) # Continued csv file, but no cubes yet
+        if fresh and os.path.exists(self.path):
+            os.remove(self.path)
+        self.connection = connect(self.path)
+        if rebuild:
+            build(self.csv_path, self.path, self.connection)
+
+    def write(self, rows : list[list[str]]):
+        update(self.connection, [dict(zip(self.column_names, row)) for row in rows])
+
+    def close(self):
+        self.connection.close()
+        self.connection = None
+
+def build(csv_path : str, path : str, connection : sqlite3.Connection = None, chunk_rows : int = 10000):
+    '''
+    Builds the cubes of an existing csv file from scratch.
+    '''
+    own_connection = connection == None
+    if own_connection:
+        if os.path.exists(path):
+            os.remove(path)
+        connection = connect(path)
+    with open(csv_path, "r", encoding="utf-16", newline="") as csv_file:
+        rows = []
+        for row in csv.DictReader(csv_file):
+            rows.append(row)
+            if len(rows) == chunk_rows:
+                update(connection, rows)
+                rows = []
+        update(connection, rows)
+    if own_connection:
+        connection.close()
+
+# ----------------------------------------
+
+def query(connection : sqlite3.Connection, dimension : str = "all", slot : str = "Any", genres : list[str] = None):
+    '''
+    Returns { (genre, bin) : (games, mean rating or None) } for one dimension, optionally only for some genres.
+    '''
+    sql = "SELECT genre, bin, games, ratings, rating_sum FROM cells WHERE slot = ? AND dimension = ?"
+    parameters = [slot, dimension]
+    if genres != None:
+        sql += f" AND genre IN ({','.join('?' * len(genres))})"
+        parameters += genres
+    return { (genre, bin) : (games, rating_sum / ratings if ratings > 0 else None)
+             for (genre, bin, games, ratings, rating_sum) in connection.execute(sql, parameters) }
+
+def games_per_genre(connection : sqlite3.Connection, slot : str = "Any"):
+    return { genre : games for ((genre, _), (games, _)) in query(connection, "all", slot).items() }
+
+def mean_rating_per_genre(connection : sqlite3.Connection, slot : str = "Any"):
+    return { genre : rating for ((genre, _), (_, rating)) in query(connection, "all", slot).items() }
+
+def histogram(connection : sqlite3.Connection, dimension : str, genre : str = None, slot : str = "Any"):
+    '''
+    Games per bin of dimension ("price", "year", "performance", "performance_amd"), for one genre or (genre None) for all games.
+    '''
+    cells = query(connection, dimension, slot, [genre]) if genre != None else query(connection, dimension, "All")
+    return { bin : games for ((_, bin), (games, _)) in sorted(cells.items()) }
+
+def total(connection : sqlite3.Connection):
+    '''
+    (games, mean rating) over all games.
+    '''
+    return query(connection, "all", "All").get(("", 0), (0, None))
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        build(sys.argv[2], sys.argv[3])
+        print(f"Cubes of {sys.argv[2]} written to {sys.argv[3]}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "show":
+        connection = connect(sys.argv[2])
+        games, rating = total(connection)
+        print(f"{games} games, mean rating {rating}\n")
+        print(f"{'Genre':<24} {'Games':>8} {'Rating':>7}")
+        ratings = mean_rating_per_genre(connection)
+        for (genre, games) in sorted(games_per_genre(connection).items(), key=lambda item: -item[1]):
+            print(f"{genre:<24} {games:>8} {ratings[genre] if ratings[genre] != None else float('nan'):>7.2f}")
+        connection.close()
+    else:
+        print("Usage: python Aggregates.py build <csv file> <cubes file> | python Aggregates.py show <cubes file>")
@@ -0,0 +1,88 @@
+import lxml.html
+import json
+
+import PageExtractor
+
+''' Settings '''
+batch_size = 20 # How many app IDs are requested from the appdetails API at once
+language = "english" # Language of genres, release dates and system requirements (same as the store pages)
+country_code = "" # Country whose prices (and currency) are returned, empty for the country Steam picks for the client like on the store pages
+fallback_fields = [] # Fields that the API does not have and that are scraped from the game page instead, e.g. ["rating", "ratingCount"]. Empty to skip the game pages entirely.
+
+'''
+Fast path for SteamScraper.get_more_data (setting use_appdetails): Gets price, release date, genres and
+the Windows system requirements from Steam's appdetails API, a small JSON document per game, instead of
+the full store page (hundreds of KB). Several app IDs are requested at once.
+Fills exactly the same game_info entries as the page extractors, except the ratings: The API has none,
+so by default the Rating and Rating count columns stay empty. Setting fallback_fields to ["rating", "ratingCount"]
+scrapes every game page for them afterwards, which costs more than use_appdetails = False (the same pages
+plus the API requests). Games that are no apps (bundles, packages) and games the API has no data for are
+always scraped from their page.
+If Steam refuses batches (it has restricted multi-ID requests at times), set batch_size = 1. The games of
+a failed batch fall back to their pages either way.
+'''
+
+def get_url(store_url : str, app_ids : list[str]):
+    url = f"{store_url}/api/appdetails?appids={','.join(app_ids)}&l={language}"
+    return url + f"&cc={country_code}" if country_code else url
+
+def get_batches(game_infos : list[dict]):
+    '''
+    Splits game_infos into batches of at most batch_size apps.
+    Returns the batches and the games that are no apps (they only have a page).
+    '''
+    apps = [game_info for game_info in game_infos if str(game_info.get("app_id", "")).isdigit()]
+    others = [game_info for game_info in game_infos if not str(game_info.get("app_id", "")).isdigit()]
+    return [apps[i:i + batch_size] for i in range(0, len(apps), batch_size)], others
+
+def parse_details(game_infos : list[dict], content : bytes):
+    '''
+    Parses the JSON response of the appdetails API for a batch of apps. Writes directly to game_infos.
+    Returns the games whose page still has to be scraped.
+    '''
+    try:
+        details = json.loads(content) or {}
+    except ValueError:
+        details = {}
+    missing = []
+    for game_info in game_infos:
+        entry = details.get(str(game_info["app_id"])) or {}
+        if not entry.get("success") or not isinstance(entry.get("data"), dict):
+            missing.append(game_info)
+            continue
+        fill_game_info(game_info, entry["data"])
+        if any(field not in game_info for field in fallback_fields):
+            missing.append(game_info)
+    return missing
+
+# ----------------------------------------
+
+def fill_game_info(game_info : dict, data : dict):
+    '''
+    Writes the "data" of an app to game_info, in the same format as the page extractors.
+    '''
+    price_overview = data.get("price_overview")
+    if data.get("is_free"):
+        game_info["price"] = "0"
+    elif isinstance(price_overview, dict) and "initial" in price_overview:
+        initial = int(price_overview["initial"]) # The price before a discount, like discount_original_price on the page
+        game_info["price"] = f"{initial // 100}.{initial % 100:02}"
+
+    release_date = data.get("release_date")
+    if isinstance(release_date, dict) and release_date.get("date"):
+        game_info["release_date"] = release_date["date"]
+
+    genres = [genre["description"] for genre in data.get("genres", []) if genre.get("description")]
+    if len(genres) > 0:
+        game_info["genre0"] = genres[0]
+    if len(genres) > 1:
+        game_info["genre1"] = genres[1]
+
+    game_info["sys_reqs_min"] = {"OS" : "", "Processor" : "", "Graphics" : "", "Memory" : "", "Storage" : ""}
+    game_info["sys_reqs_rec"] = {"OS" : "", "Processor" : "", "Graphics" : "", "Memory" : "", "Storage" : ""}
+    pc_requirements = data.get("pc_requirements")
+    if isinstance(pc_requirements, dict): # An empty list if the game has none
+        for (field, key) in (("minimum", "sys_reqs_min"), ("recommended", "sys_reqs_rec")):
+            if pc_requirements.get(field):
+                col = lxml.html.fragment_fromstring(pc_requirements[field], create_parent="div")
+                PageExtractor.extract_sys_req_items(game_info[key], col)
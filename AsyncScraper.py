@@ -0,0 +1,159 @@
+import asyncio
+import aiohttp
+import time
+
+import SteamScraper
+import PageFetcher
+import Checkpoint
+import RequestScheduler
+import AppDetails
+import Metrics
+
+''' Settings '''
+search_concurrency = 2 # How many search pages may be fetched at the same time (the rest of max_connections goes to game pages)
+queue_size = 256 # Maximum number of games waiting to be fetched. Keeps the search pages from running too far ahead.
+
+'''
+Asyncio engine for SteamScraper.
+Search pages (producers) and game pages (consumers) run as one continuous pipeline:
+Games are put into a queue as soon as their search page arrives and are picked up by
+whichever consumer is free, so nothing waits for the slowest page of a batch. Only the writing does:
+Finished batches are written in the order of their offsets, so the csv file keeps the topseller order.
+All requests share one pooled aiohttp session, whose connector enforces the global limit,
+and go through the same response cache as the threaded engine (PageFetcher.py).
+Parsing stays in SteamScraper (parse_games, parse_missing_data) and AppDetails.py and is run in worker threads
+so that it does not block the event loop.
+'''
+
+async def scrape(batches : int, max_connections : int):
+    connector = aiohttp.TCPConnector(limit=max_connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        games_queue = asyncio.Queue(maxsize=queue_size)
+        search_semaphore = asyncio.Semaphore(search_concurrency)
+        pending_batches = { offset : [None, None] for offset in range(0, batches) } # offset -> [game_infos, number of games still being fetched], in offset order
+        Metrics.register_gauge("queue_depth", games_queue.qsize, stage="games")
+
+        consumers = [asyncio.create_task(consume(session, games_queue, pending_batches)) for _ in range(max_connections)]
+        await asyncio.gather(*[produce(session, games_queue, search_semaphore, pending_batches, offset) for offset in range(0, batches)])
+        await games_queue.join()
+        for consumer in consumers:
+            consumer.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+        Metrics.remove_gauges("queue_depth")
+
+async def fetch(session : aiohttp.ClientSession, url : str):
+    '''
+    Async version of PageFetcher.fetch: Same cache, same scheduler, same retries.
+    '''
+    connect_timeout, read_timeout = RequestScheduler.timeout
+    attempt = 0
+    while True:
+        wait = RequestScheduler.try_acquire()
+        while wait > 0:
+            await asyncio.sleep(min(wait, 0.1))
+            wait = RequestScheduler.try_acquire()
+        start_time = time.monotonic()
+        status, retry_after, error = None, None, None
+        request_headers = PageFetcher.conditional_headers(url)
+        try:
+            async with session.get(url, headers=request_headers,
+                                   timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)) as response:
+                status = response.status
+                retry_after = RequestScheduler.get_retry_after(response.headers)
+                content = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status, error = None, e
+        RequestScheduler.release(status, time.monotonic() - start_time, retry_after)
+        PageFetcher.record_response(status, time.monotonic() - start_time)
+        if status in (200, 304):
+            content = PageFetcher.handle_response(url, status, response.headers, content)
+            if content != None:
+                return content
+            if len(request_headers) == 0:
+                raise aiohttp.ClientResponseError(response.request_info, (), status=status, message=f"304 for {url} without a conditional request")
+            continue # The cached body is gone, repeat the request without the conditional headers
+        if status != None and not RequestScheduler.is_retryable(status):
+            raise aiohttp.ClientResponseError(response.request_info, (), status=status, message=f"{status} for {url}")
+        if attempt >= RequestScheduler.max_retries:
+            if error != None:
+                raise error
+            raise aiohttp.ClientResponseError(response.request_info, (), status=status, message=f"{status} for {url} after {attempt} retries")
+        with PageFetcher.stats_lock:
+            PageFetcher.stats["retries"] += 1
+        await asyncio.sleep(RequestScheduler.backoff_delay(attempt, retry_after))
+        attempt += 1
+
+async def produce(session : aiohttp.ClientSession, games_queue : asyncio.Queue, search_semaphore : asyncio.Semaphore, pending_batches : dict, offset : int):
+    '''
+    Gets the games of one search page and puts the new or stale ones into games_queue.
+    '''
+    if Checkpoint.is_batch_completed(offset):
+        pending_batches[offset] = [None, 0] # Nothing to write, but the batches behind it may be
+        write_batches(pending_batches)
+        return
+    async with search_semaphore:
+        if SteamScraper.verbose: print(f"Getting games in batch {offset}")
+        content = await fetch(session, SteamScraper.get_search_url(offset))
+        game_infos = []
+        SteamScraper.parse_games(game_infos, content)
+    game_infos = Checkpoint.filter_stale(game_infos)
+    page_infos = await get_app_details(session, game_infos) if SteamScraper.use_appdetails else game_infos
+    pending_batches[offset] = [game_infos, len(page_infos)]
+    if len(page_infos) == 0:
+        write_batches(pending_batches)
+        return
+    for game_info in page_infos:
+        await games_queue.put((offset, game_info))
+
+async def get_app_details(session : aiohttp.ClientSession, game_infos : list[dict]):
+    '''
+    Async version of SteamScraper.get_app_details: Gets the data of game_infos from the appdetails API.
+    Returns the games whose Steam page still has to be fetched.
+    '''
+    loop = asyncio.get_running_loop()
+    app_batches, page_infos = AppDetails.get_batches(game_infos)
+    async def get_details(app_batch : list[dict]):
+        try:
+            content = await fetch(session, AppDetails.get_url(SteamScraper.store_url, [game_info["app_id"] for game_info in app_batch]))
+        except Exception as e:
+            if SteamScraper.verbose: print(f"Failed to get app details, falling back to the game pages: {e}")
+            return app_batch
+        return await loop.run_in_executor(None, AppDetails.parse_details, app_batch, content)
+    for missing in await asyncio.gather(*[get_details(app_batch) for app_batch in app_batches]):
+        page_infos.extend(missing)
+    return page_infos
+
+async def consume(session : aiohttp.ClientSession, games_queue : asyncio.Queue, pending_batches : dict):
+    '''
+    Fetches and parses game pages from games_queue until cancelled.
+    Writes a batch to the csv file as soon as its last game and the batches in front of it are done.
+    '''
+    loop = asyncio.get_running_loop()
+    while True:
+        offset, game_info = await games_queue.get()
+        try:
+            content = await fetch(session, game_info["url"])
+            await loop.run_in_executor(None, SteamScraper.parse_missing_data, game_info, content)
+        except Exception as e:
+            SteamScraper.mark_failed(game_info, e)
+        finally:
+            pending_batches[offset][1] -= 1
+            if pending_batches[offset][1] == 0:
+                write_batches(pending_batches)
+            games_queue.task_done()
+
+def write_batches(pending_batches : dict):
+    '''
+    Writes the finished batches at the front of pending_batches to the csv file and checkpoints them.
+    A batch waits for the batches in front of it, so the csv file keeps the topseller order like the threaded engine.
+    '''
+    while len(pending_batches) > 0:
+        offset, (game_infos, remaining) = next(iter(pending_batches.items()))
+        if remaining != 0:
+            return
+        del pending_batches[offset]
+        if game_infos == None: # Completed in an earlier run
+            continue
+        if SteamScraper.verbose: print(f"Writing batch {offset} to file")
+        SteamScraper.write_data_to_csv_file(game_infos)
+        Checkpoint.complete_batch(offset, game_infos)
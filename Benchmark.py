@@ -0,0 +1,705 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
+import tempfile
+import json
+import time
+import sys
+import os
+
+import SteamScraper
+import HardwareParser
+import GPUIndex
+import GPUDataset
+import DatasetCache
+import Aggregates
+import History
+import OutputSinks
+import PageFetcher
+import Checkpoint
+import RequestScheduler
+import AppDetails
+import Metrics
+import StubServer
+
+''' Settings '''
+benchmark_batches = 10 # How many search pages (50 games each) every engine has to scrape
+benchmark_latency = 0.05 # Simulated network latency of the stub server in seconds
+streaming_memory_growth = 1.25 # benchmark_memory fails if the peak of the streaming engine grows by more than this factor from the smallest to the largest batches
+
+'''
+Benchmarks for the different engines of SteamScraper.
+Everything runs against the local stub server (StubServer.py), never against the real Steam store.
+'''
+
+@contextmanager
+def overridden_settings(settings : dict):
+    '''
+    Overrides settings of the scraper modules (e.g. { "max_workers" : 32 }) and restores them afterwards,
+    so no benchmark runs with the settings of the one before it.
+    '''
+    saved = []
+    try:
+        for (key, value) in settings.items():
+            module = next(m for m in (PageFetcher, Checkpoint, RequestScheduler, AppDetails, SteamScraper) if hasattr(m, key))
+            saved.append((module, key, getattr(module, key)))
+            setattr(module, key, value)
+        yield
+    finally:
+        for (module, key, value) in reversed(saved):
+            setattr(module, key, value)
+
+def run_scraper(base_url : str, csv_path : str, **settings):
+    '''
+    Runs SteamScraper.main against base_url with the given settings overridden (only for this run).
+    Engine flags that are not given are reset to the threaded engine.
+    Returns the elapsed wall time in seconds.
+    '''
+    settings = {
+        "store_url" : base_url, "csv_path" : csv_path, "batches" : benchmark_batches, "verbose" : False,
+        "use_cache" : False, "resume" : False, "use_appdetails" : False, "adaptive" : True,
+        "max_requests_per_second" : 10000, # Only the engines are compared here, not the rate limit
+        "multithreaded" : True, "multiprocess" : False, "asynchronous" : False, "streaming" : False,
+        **settings
+    }
+    PageFetcher.reset_stats()
+    with overridden_settings(settings):
+        RequestScheduler.reset()
+        start_time = time.perf_counter()
+        SteamScraper.main()
+        elapsed = time.perf_counter() - start_time
+    return elapsed
+
+def count_rows(csv_path : str):
+    with open(csv_path, "r", encoding="utf-16") as csv_file:
+        return sum(1 for _ in csv_file) - 1
+
+def count_complete_rows(csv_path : str):
+    '''
+    Rows whose game page was actually scraped (every stub page has a release date).
+    '''
+    import csv
+    with open(csv_path, "r", encoding="utf-16", newline="") as csv_file:
+        return sum(1 for row in csv.DictReader(csv_file) if row["Release date"] != "")
+
+def start_stub_server():
+    StubServer.games_total = benchmark_batches * 50
+    StubServer.latency = benchmark_latency
+    return StubServer.start()
+
+def benchmark_engines():
+    '''
+    Compares pages per second of the threaded engine and the asyncio engine.
+    '''
+    server, base_url = start_stub_server()
+    engines = {
+        "threaded" : { "multithreaded" : True, "multiprocess" : False, "asynchronous" : False },
+        "multiprocess" : { "multithreaded" : False, "multiprocess" : True, "asynchronous" : False },
+        "asyncio"  : { "multithreaded" : False, "multiprocess" : False, "asynchronous" : True },
+        "streaming" : { "multithreaded" : False, "multiprocess" : False, "asynchronous" : False, "streaming" : True },
+    }
+    print(f"\nEngines: {benchmark_batches} batches, {benchmark_latency}s latency\n")
+    with tempfile.TemporaryDirectory() as directory:
+        for (name, settings) in engines.items():
+            csv_path = os.path.join(directory, f"{name}.csv")
+            elapsed = run_scraper(base_url, csv_path, **settings)
+            rows = count_rows(csv_path)
+            pages = rows + benchmark_batches
+            print(f"{name:<12} {rows} rows  {elapsed:.2f}s  {pages / elapsed:.1f} pages/s")
+    server.shutdown()
+
+def benchmark_cache():
+    '''
+    Scrapes the stub store twice with the response cache enabled.
+    The second run should be answered almost entirely with 304s.
+    '''
+    server, base_url = start_stub_server()
+    print(f"\nResponse cache: {benchmark_batches} batches, {benchmark_latency}s latency\n")
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "cache.csv")
+        cache_dir = os.path.join(directory, "cache")
+        for run in ("cold", "warm"):
+            elapsed = run_scraper(base_url, csv_path, use_cache=True, cache_dir=cache_dir)
+            print(f"{run:<10} {elapsed:.2f}s  {PageFetcher.stats_summary()}")
+    server.shutdown()
+
+def load_golden_pages():
+    '''
+    Returns (name, page content, expected game_info) for every saved page in GoldenPages/.
+    '''
+    golden_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GoldenPages")
+    pages = []
+    for file_name in sorted(os.listdir(golden_dir)):
+        if not file_name.endswith(".html"):
+            continue
+        name = file_name[:-len(".html")]
+        with open(os.path.join(golden_dir, file_name), "rb") as html_file:
+            content = html_file.read()
+        with open(os.path.join(golden_dir, name + ".json"), "r", encoding="utf-8") as json_file:
+            expected = json.load(json_file)
+        pages.append((name, content, expected))
+    return pages
+
+def parse_page(content : bytes, fast_extractor : bool):
+    SteamScraper.fast_extractor = fast_extractor
+    game_info = {}
+    SteamScraper.parse_more_data(game_info, content)
+    return game_info
+
+def check_golden_pages():
+    '''
+    Checks that both game page extractors produce the golden game_infos in GoldenPages/ (python Benchmark.py golden).
+    Raises an AssertionError for the first page that does not match. Returns the golden pages.
+    '''
+    golden_pages = load_golden_pages()
+    for (name, content, expected) in golden_pages:
+        for fast_extractor in (False, True):
+            if parse_page(content, fast_extractor) != expected:
+                raise AssertionError(f"Extractor (fast_extractor={fast_extractor}) does not match the golden file for {name}")
+    SteamScraper.fast_extractor = True
+    print(f"\nExtractors: {len(golden_pages)} golden pages match\n")
+    return golden_pages
+
+def benchmark_extractors(repetitions : int = 50):
+    '''
+    Checks the extractors against the golden pages (see check_golden_pages),
+    then compares their parse time per page on the golden pages and on a full-size page.
+    '''
+    golden_pages = check_golden_pages()
+    corpora = {
+        "golden pages" : [content for (_, content, _) in golden_pages],
+        "full-size page" : [StubServer.game_page_html(5).encode("utf-8")],
+    }
+    for (corpus_name, contents) in corpora.items():
+        timings = {}
+        for fast_extractor in (False, True):
+            start_time = time.perf_counter()
+            for _ in range(repetitions):
+                for content in contents:
+                    parse_page(content, fast_extractor)
+            timings[fast_extractor] = (time.perf_counter() - start_time) / (repetitions * len(contents))
+        print(f"{corpus_name:<16} BeautifulSoup {timings[False] * 1000:.2f}ms/page  lxml {timings[True] * 1000:.2f}ms/page  ({timings[False] / timings[True]:.1f}x)")
+    SteamScraper.fast_extractor = True
+
+def benchmark_parse_pool(pages : int = 2000):
+    '''
+    Compares parsing a corpus of full-size game pages in threads (GIL-bound) and in the process pool,
+    the way SteamScraper does it in multithreaded and multiprocess mode.
+    '''
+    corpus = [({ "name" : f"Game {app_id}", "url" : "" }, StubServer.game_page_html(app_id).encode("utf-8")) for app_id in range(pages)]
+    chunks = [corpus[i:i + SteamScraper.parse_chunk_size] for i in range(0, len(corpus), SteamScraper.parse_chunk_size)]
+    print(f"\nParsing: {pages} pages, {SteamScraper.max_workers} threads vs {SteamScraper.parse_processes} processes\n")
+    with ThreadPoolExecutor(max_workers=SteamScraper.max_workers) as executor:
+        start_time = time.perf_counter()
+        list(executor.map(SteamScraper.parse_pages, [[page] for page in corpus]))
+        elapsed = time.perf_counter() - start_time
+    print(f"{'threads':<12} {pages / elapsed:.1f} pages/s")
+    with ProcessPoolExecutor(max_workers=SteamScraper.parse_processes) as process_pool:
+        list(process_pool.map(SteamScraper.parse_pages, chunks[:SteamScraper.parse_processes])) # Start up the processes first
+        start_time = time.perf_counter()
+        list(process_pool.map(SteamScraper.parse_pages, chunks))
+        elapsed = time.perf_counter() - start_time
+    print(f"{'processes':<12} {pages / elapsed:.1f} pages/s")
+
+def synthetic_rows(count : int):
+    '''
+    Rows as SteamScraper writes them, with varying genres, prices, dates and GPUs.
+    '''
+    genres = ["Action", "Adventure", "Casual", "Indie", "RPG", "Simulation", "Strategy", "Sports", "Racing", "Massively Multiplayer"]
+    nvidia = ["GeForce GTX 960", "GeForce GTX 1060", "GeForce GTX 1070 Ti", "GeForce RTX 2070 SUPER", "GeForce RTX 3080", ""]
+    amd = ["Radeon RX 470", "Radeon RX 580", "Radeon RX 5700 XT", "Radeon RX 6800 XT", ""]
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    rows = []
+    for i in range(count):
+        game_info = {
+            "name" : f"Game {i}", "price" : f"{i % 60}.99", "release_date" : f"{i % 28 + 1} {months[i % 12]}, {2000 + i % 23}",
+            "genre0" : genres[i % 10], "genre1" : genres[(i * 7) % 10], "rating" : str(i % 10 + 1), "ratingCount" : str(i * 7 % 100000),
+            "sys_reqs_min" : { "OS" : "Windows 10 64 bit", "Processor" : "Intel Core i5-4590", "Graphics" : f"NVIDIA {nvidia[i % 6]} or AMD {amd[i % 5]}",
+                               "Memory" : "8 GB RAM", "Storage" : f"{i % 90 + 10} GB available space" },
+            "sys_reqs_rec" : { "OS" : "Windows 10 64 bit", "Processor" : "Intel Core i7-8700", "Graphics" : f"NVIDIA {nvidia[(i + 2) % 6]} or AMD {amd[(i + 2) % 5]}",
+                               "Memory" : "16 GB RAM", "Storage" : f"{i % 90 + 10} GB available space" },
+            "app_id" : str(i),
+        }
+        rows.append(SteamScraper.get_row(game_info))
+    return rows
+
+def benchmark_output(rows : int = 200000):
+    '''
+    Compares the csv file and the Parquet sink: file size, and loading + grouping the way SteamAnalysis.ipynb does it.
+    '''
+    import pandas as pd
+    data = synthetic_rows(rows)
+    print(f"\nOutputs: {rows} rows\n")
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "data.csv")
+        parquet_path = os.path.join(directory, "data.parquet")
+        start_time = time.perf_counter()
+        with open(csv_path, "w", encoding="utf-16") as csv_file:
+            csv_file.write(",".join(SteamScraper.column_names) + "\n")
+            csv_file.write("".join(",".join(SteamScraper.quote(value) for value in row) + "\n" for row in data))
+        csv_write = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        OutputSinks.open_sinks({ "parquet" : parquet_path }, SteamScraper.column_names, csv_path, fresh=True)
+        for i in range(0, rows, 50):
+            OutputSinks.write(data[i:i + 50])
+        OutputSinks.close_sinks()
+        parquet_write = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        games = pd.read_csv(csv_path, encoding="utf-16")
+        games["Release date"] = pd.to_datetime(games["Release date"], format="%d %b, %Y")
+        games.groupby(by="Genre 1")["Rating"].mean()
+        csv_load = time.perf_counter() - start_time
+        csv_memory = games.memory_usage(deep=True).sum()
+        start_time = time.perf_counter()
+        games = pd.read_parquet(parquet_path)
+        games["Release date"] = pd.to_datetime(games["Release date"])
+        games.groupby(by="Genre 1", observed=True)["Rating"].mean()
+        parquet_load = time.perf_counter() - start_time
+        parquet_memory = games.memory_usage(deep=True).sum()
+
+        print(f"{'csv':<10} {os.path.getsize(csv_path) / 1024**2:.1f} MB  write {csv_write:.2f}s  load + group {csv_load:.2f}s  {csv_memory / 1024**2:.0f} MB in memory")
+        print(f"{'parquet':<10} {os.path.getsize(parquet_path) / 1024**2:.1f} MB  write {parquet_write:.2f}s  load + group {parquet_load:.2f}s  {parquet_memory / 1024**2:.0f} MB in memory")
+
+def synthetic_graphics(count : int):
+    '''
+    Graphics requirement strings like on Steam. Most of them repeat, like on Steam.
+    '''
+    nvidia = ["GeForce GTX 660", "GTX 960", "NVIDIA GeForce GTX 1060 6GB", "GeForce GTX1070 Ti", "RTX 2070 SUPER", "NVIDIA RTX 3080", "GeForce 8800 GT", ""]
+    amd = ["AMD Radeon RX 470", "Radeon RX 580 8GB", "AMD RX 5700 XT", "Radeon R9 290", "AMD Radeon HD 7870", ""]
+    templates = ["{n} or {a}", "{n} / {a}", "{n}, {a} or better", "{a} | {n} (2GB VRAM)", "{n} or equivalent", "DirectX 11 compatible, {n}", "Intel HD Graphics 4000"]
+    variants = [template.format(n=n, a=a) for template in templates for n in nvidia for a in amd]
+    return [variants[(i * 7919) % len(variants)] + (" " * (i % 3)) for i in range(count)]
+
+def process_graphics_regex_uncached(graphics : str):
+    '''
+    HardwareParser.process_graphics_regex as it was before: Patterns as strings and findall on every call.
+    '''
+    import regex
+    nvidiaPattern = "(?:GeForce)*\\s{0,1}(?:GTX|RTX)\\s[0-9]{1,4}\\s{0,1}(?:Ti|SUPER)*"
+    amdPattern = "(?:Radeon)*\\s{0,1}(?:RX)\\s{0,1}[0-9]{0,4}\\s{0,1}(?:XT)*"
+    nvidiaMatches = regex.findall(nvidiaPattern, graphics)
+    amdMatches = regex.findall(amdPattern, graphics)
+    nvidia = nvidiaMatches[0].strip() if len(nvidiaMatches) > 0 else ""
+    amd = amdMatches[0].strip() if len(amdMatches) > 0 else ""
+    if len(nvidia) > 0 and not nvidia.startswith("GeForce"):
+        nvidia = "GeForce " + nvidia
+    return nvidia, amd
+
+def benchmark_hardware_parser(count : int = 200000):
+    '''
+    Compares the old per-call graphics regex, the cached one and the batch API on a synthetic corpus.
+    '''
+    import pandas as pd
+    corpus = synthetic_graphics(count)
+    print(f"\nHardwareParser: {count} strings, {len(set(corpus))} distinct\n")
+    start_time = time.perf_counter()
+    expected = [process_graphics_regex_uncached(graphics) for graphics in corpus]
+    uncached = time.perf_counter() - start_time
+    HardwareParser.process_graphics_regex_cached.cache_clear()
+    start_time = time.perf_counter()
+    cached = [HardwareParser.process_graphics_regex(graphics) for graphics in corpus]
+    cached_time = time.perf_counter() - start_time
+    series = pd.Series(corpus)
+    HardwareParser.process_graphics_regex_cached.cache_clear()
+    start_time = time.perf_counter()
+    nvidia, amd = HardwareParser.process_graphics_regex_batch(series)
+    batch_time = time.perf_counter() - start_time
+    if cached != expected or list(zip(nvidia, amd)) != expected:
+        raise AssertionError("HardwareParser results differ from the uncached implementation")
+    for (name, elapsed) in (("uncached", uncached), ("cached", cached_time), ("batch", batch_time)):
+        print(f"{name:<10} {elapsed:.2f}s  {count / elapsed / 1000:.0f}k strings/s")
+
+def benchmark_gpu_index(count : int = 100000):
+    '''
+    Match rate and throughput of GPUIndex on spelling variations of the cards in NvidiaGPUs.csv,
+    compared to the exact-name join that SteamAnalysis.ipynb used to do.
+    '''
+    import csv
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "NvidiaGPUs.csv"), "r", encoding="utf-8", newline="") as table_file:
+        cards = [row["Card"] for row in csv.DictReader(table_file)]
+    variations = [
+        lambda card: card,
+        lambda card: "NVIDIA " + card,
+        lambda card: card.replace("GeForce ", ""),
+        lambda card: card.replace("GTX ", "GTX").replace("RTX ", "RTX"),
+        lambda card: card + " 4GB",
+        lambda card: card.upper(),
+        lambda card: HardwareParser.process_graphics_regex(f"NVIDIA {card} or AMD Radeon RX 580")[0],
+    ]
+    names = [variations[i % len(variations)](cards[(i * 31) % len(cards)]) for i in range(count)]
+    known_cards = set(cards)
+    exact_matches = sum(1 for name in names if name in known_cards)
+    GPUIndex.load()
+    start_time = time.perf_counter()
+    cold = [GPUIndex.resolve(name) for name in names]
+    cold_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    GPUIndex.resolve_batch(names)
+    batch_time = time.perf_counter() - start_time
+    matches = sum(1 for performance in cold if performance != None)
+    print(f"\nGPUIndex: {count} names, {len(set(names))} distinct\n")
+    print(f"{'exact join':<10} {exact_matches / count:.1%} matched")
+    print(f"{'index':<10} {matches / count:.1%} matched  {count / cold_time / 1000:.0f}k names/s (cold cache)  {count / batch_time / 1000:.0f}k names/s (batch, warm)")
+
+def benchmark_gpu_dataset(count : int = 20000, repetitions : int = 20):
+    '''
+    Builds the tables from a synthetic source of count NVIDIA and AMD cards with the loops of
+    GPUDatasetCreation.ipynb (list comprehensions and list.index lookups) and with GPUDataset.merge_sources.
+    Also compares loading GPUIndex from the csv tables and from the binary lookup table.
+    '''
+    families = ["GTX", "RTX", "RX", "R9"]
+    names = [f"{families[i % len(families)]} {1000 + i}" for i in range(count)]
+    scores = [float((i * 7919) % 10007) for i in range(count)]
+    print(f"\nGPU dataset: {count} cards\n")
+    start_time = time.perf_counter()
+    smax, smin = max(scores), min(scores)
+    normalized = [1 + ((10 - 1) / (smax - smin)) * (p - smin) for p in scores]
+    nvidia_cards = list(filter(lambda s: s.startswith("GTX") or s.startswith("RTX"), names))
+    nvidia_performances = [normalized[names.index(c)] for c in nvidia_cards]
+    notebook_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    GPUDataset.merge_sources({ "synthetic" : (names, scores) }, ["nvidia", "amd"])
+    builder_time = time.perf_counter() - start_time
+    print(f"{'notebook':<10} {notebook_time:>7.3f} s  (NVIDIA only)")
+    print(f"{'builder':<10} {builder_time:>7.3f} s  (NVIDIA and AMD, deduplicated and sorted)")
+    with tempfile.TemporaryDirectory() as directory:
+        lookup_path = os.path.join(directory, GPUIndex.lookup_table or "GPUs.npz") # Not the lookup table of the repository
+        GPUIndex.save_lookup_table(lookup_path)
+        for (name, load) in (("csv", lambda: GPUIndex.load(GPUIndex.gpu_tables)), ("lookup", lambda: GPUIndex.load_lookup_table(lookup_path))):
+            start_time = time.perf_counter()
+            for _ in range(repetitions):
+                load()
+            print(f"{name + ' load':<10} {1000 * (time.perf_counter() - start_time) / repetitions:>7.2f} ms  ({len(GPUIndex.index)} keys)")
+
+def benchmark_changes(ranking_shift : int = 10):
+    '''
+    Scrapes the stub store while its ranking shifts by ranking_shift games per search page and checks that
+    no game is scraped twice, then scrapes it again with changed prices and compares the delta file with the csv file.
+    '''
+    import csv
+    server, base_url = start_stub_server()
+    StubServer.ranking_shift = ranking_shift
+    max_age = Checkpoint.max_age
+    print(f"\nChange detection: {benchmark_batches} batches, ranking shifts by {ranking_shift} games per page\n")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, "Changes.csv")
+            for (run, settings) in enumerate(({ "resume" : False }, { "resume" : True, "max_age" : 0 })):
+                StubServer.price_change = 5 * run
+                elapsed = run_scraper(base_url, csv_path, **settings)
+                with open(csv_path, "r", encoding="utf-16", newline="") as csv_file:
+                    app_ids = [row["App ID"] for row in csv.DictReader(csv_file)]
+                delta_path = Checkpoint.get_delta_path(csv_path, run + 1)
+                changes = {}
+                if os.path.exists(delta_path):
+                    with open(delta_path, "r", encoding="utf-16", newline="") as delta_file:
+                        for row in csv.DictReader(delta_file):
+                            changes[row["Change"]] = changes.get(row["Change"], 0) + 1
+                skipped = sum(value["value"] for value in Metrics.snapshot()["counters"] if value["name"] == "duplicates_skipped_total")
+                delta_size = os.path.getsize(delta_path) if os.path.exists(delta_path) else 0
+                print(f"run {run + 1}  {len(app_ids)} rows ({len(app_ids) - len(set(app_ids))} duplicates), {skipped} duplicates skipped, {elapsed:.2f}s  "
+                      f"delta: {changes}, {delta_size / 1024:.0f} KB of {os.path.getsize(csv_path) / 1024:.0f} KB")
+    finally:
+        StubServer.ranking_shift, StubServer.price_change = 0, 0
+        server.shutdown()
+        Checkpoint.max_age = max_age
+
+def benchmark_dataset_cache(rows : int = 200000):
+    '''
+    Loads a synthetic csv file the way SteamAnalysis.ipynb used to (read_csv, to_datetime, GPU join),
+    and through DatasetCache.py without a cache (cold) and with one (warm).
+    '''
+    import pandas as pd
+    import pyarrow as pa
+    data = synthetic_rows(rows)
+    print(f"\nDataset cache: {rows} rows\n")
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "data.csv")
+        with open(csv_path, "w", encoding="utf-16") as csv_file:
+            csv_file.write(",".join(SteamScraper.column_names) + "\n")
+            csv_file.write("".join(",".join(SteamScraper.quote(value) for value in row) + "\n" for row in data))
+        del data
+        start_time = time.perf_counter()
+        games = pd.read_csv(csv_path, encoding="utf-16")
+        games["Release date"] = pd.to_datetime(games["Release date"], format="%d %b, %Y")
+        games["Performance"] = GPUIndex.resolve_batch(games["Rec Graphics NVIDIA"])
+        games["Performance AMD"] = GPUIndex.resolve_batch(games["Rec Graphics AMD"])
+        notebook = (time.perf_counter() - start_time, games.memory_usage(deep=True).sum())
+        start_time = time.perf_counter()
+        games = DatasetCache.load(csv_path)
+        cold = (time.perf_counter() - start_time, games.memory_usage(deep=True).sum())
+        start_time = time.perf_counter()
+        games = DatasetCache.load(csv_path)
+        warm = (time.perf_counter() - start_time, games.memory_usage(deep=True).sum())
+        del games
+        allocated = pa.total_allocated_bytes()
+        start_time = time.perf_counter()
+        table = DatasetCache.load_table(csv_path)
+        mapped = (time.perf_counter() - start_time, pa.total_allocated_bytes() - allocated)
+        print(f"{'notebook':<12} {notebook[0]:>7.3f}s  {notebook[1] / 1024**2:>5.0f} MB DataFrame")
+        print(f"{'cold':<12} {cold[0]:>7.3f}s  {cold[1] / 1024**2:>5.0f} MB DataFrame  (builds {os.path.getsize(DatasetCache.get_cache_path(csv_path)) / 1024**2:.0f} MB cache)")
+        print(f"{'warm':<12} {warm[0]:>7.3f}s  {warm[1] / 1024**2:>5.0f} MB DataFrame")
+        print(f"{'warm table':<12} {mapped[0]:>7.3f}s  {mapped[1] / 1024**2:>5.0f} MB allocated ({table.nbytes / 1024**2:.0f} MB memory-mapped)")
+
+def benchmark_aggregates(rows : int = 200000, repetitions : int = 100):
+    '''
+    Feeds synthetic rows through the aggregate sink in batches like the scraper does, then compares the
+    analysis queries on the cubes with pandas groupbys over the full (already loaded) DataFrame.
+    '''
+    import pandas as pd
+    data = synthetic_rows(rows)
+    print(f"\nAggregates: {rows} rows\n")
+    with tempfile.TemporaryDirectory() as directory:
+        sink = Aggregates.AggregateSink(os.path.join(directory, "cubes.sqlite"), SteamScraper.column_names, None)
+        sink.open(True)
+        start_time = time.perf_counter()
+        for i in range(0, rows, 50):
+            sink.write(data[i:i + 50])
+        ingest_time = time.perf_counter() - start_time
+        sink.close()
+        games = pd.DataFrame(data, columns=SteamScraper.column_names)
+        games["Rating"] = pd.to_numeric(games["Rating"])
+        games["Performance"] = GPUIndex.resolve_batch(games["Rec Graphics NVIDIA"])
+        questions = {
+            "games per genre" : (lambda: games.groupby("Genre 1").size(), lambda connection: Aggregates.games_per_genre(connection, "Genre 1")),
+            "mean rating" : (lambda: games.groupby("Genre 1")["Rating"].mean(), lambda connection: Aggregates.mean_rating_per_genre(connection, "Genre 1")),
+            "gpu histogram" : (lambda: games.groupby(["Genre 1", games["Performance"].floordiv(1)]).size(), lambda connection: Aggregates.query(connection, "performance", "Genre 1")),
+        }
+        connection = Aggregates.connect(os.path.join(directory, "cubes.sqlite"))
+        print(f"ingest     {1e6 * ingest_time / rows:.1f} µs per row ({rows / ingest_time:.0f} rows/s)")
+        for (name, (pandas_query, cube_query)) in questions.items():
+            start_time = time.perf_counter()
+            for _ in range(repetitions):
+                pandas_query()
+            pandas_time = (time.perf_counter() - start_time) / repetitions
+            start_time = time.perf_counter()
+            for _ in range(repetitions):
+                cube_query(connection)
+            cube_time = (time.perf_counter() - start_time) / repetitions
+            print(f"{name:<16} pandas {1000 * pandas_time:>7.2f} ms  cubes {1000 * cube_time:>6.2f} ms")
+        connection.close()
+
+def benchmark_history(apps : int = 10000, days : int = 180):
+    '''
+    Records days daily runs of apps games (a few prices and ratings change every day, rating counts grow)
+    into the history store and compares it with keeping a full csv copy of price, rating and rating count
+    per day: storage, and the two history queries.
+    '''
+    import random
+    import csv
+    random.seed(0)
+    print(f"\nHistory: {apps} games, {days} daily runs\n")
+    values = { app_id : [float(random.randint(0, 60)) + 0.99, float(random.randint(1, 10)), random.randint(0, 100000)] for app_id in range(apps) }
+    first_day = time.mktime((2026, 1, 1, 12, 0, 0, 0, 0, -1))
+    with tempfile.TemporaryDirectory() as directory:
+        store_dir, copies_dir = os.path.join(directory, "history"), os.path.join(directory, "copies")
+        os.makedirs(copies_dir)
+        connection = History.connect(store_dir)
+        record_time = 0.0
+        for day in range(days):
+            for app_values in values.values():
+                if random.random() < 0.02:
+                    app_values[0] = float(random.randint(0, 60)) + 0.99
+                if random.random() < 0.01:
+                    app_values[1] = float(random.randint(1, 10))
+                app_values[2] += random.randint(0, 5) if random.random() < 0.3 else 0
+            start_time = time.perf_counter()
+            History.record(connection, store_dir, [(app_id, *app_values) for (app_id, app_values) in values.items()], first_day + day * 86400)
+            record_time += time.perf_counter() - start_time
+            snapshot_date = time.strftime("%Y-%m-%d", time.localtime(first_day + day * 86400))
+            with open(os.path.join(copies_dir, f"{snapshot_date}.csv"), "w", encoding="utf-16", newline="") as copy_file:
+                writer = csv.writer(copy_file, quoting=csv.QUOTE_ALL, lineterminator="\n")
+                writer.writerow(["App ID", "Price", "Rating", "Rating count"])
+                writer.writerows((app_id, *app_values) for (app_id, app_values) in values.items())
+        get_size = lambda path: sum(os.path.getsize(os.path.join(root, name)) for (root, _, names) in os.walk(path) for name in names)
+        start_time = time.perf_counter()
+        copies_history = []
+        for name in sorted(os.listdir(copies_dir)):
+            with open(os.path.join(copies_dir, name), "r", encoding="utf-16", newline="") as copy_file:
+                copies_history.extend((name, row["Price"]) for row in csv.DictReader(copy_file) if row["App ID"] == "42")
+        copies_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        history = History.get_history(connection, store_dir, 42, "price")
+        history_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        changes = History.get_changes(connection, store_dir, "2026-03-01", "2026-03-07", "rating")
+        changes_time = time.perf_counter() - start_time
+        print(f"{'daily copies':<14} {get_size(copies_dir) / 1024**2:>7.1f} MB  price history of one game {1000 * copies_time:>8.1f} ms")
+        print(f"{'history':<14} {get_size(store_dir) / 1024**2:>7.1f} MB  price history of one game {1000 * history_time:>8.1f} ms ({len(history)} changes)  "
+              f"rating changes in a week {1000 * changes_time:.1f} ms ({len(changes)} games)  record {1000 * record_time / days:.0f} ms per run")
+        connection.close()
+
+def benchmark_scheduler():
+    '''
+    Scrapes a stub store that throttles (429 above 8 concurrent requests), fails and hangs now and then,
+    with a fixed pool of 32 workers and with the adaptive request scheduler.
+    '''
+    StubServer.capacity, StubServer.error_rate, StubServer.hang_rate, StubServer.hang_time = 8, 0.02, 0.002, 3
+    page_padding, StubServer.page_padding = StubServer.page_padding, 10
+    server, base_url = start_stub_server()
+    print(f"\nScheduler: {benchmark_batches} batches, capacity {StubServer.capacity}, {StubServer.error_rate:.0%} errors, {StubServer.hang_rate:.1%} hangs\n")
+    with tempfile.TemporaryDirectory() as directory:
+        for (name, adaptive) in (("fixed pool", False), ("adaptive", True)):
+            csv_path = os.path.join(directory, f"{name}.csv")
+            elapsed = run_scraper(base_url, csv_path, multithreaded=True, multiprocess=False, asynchronous=False, max_workers=32,
+                                  adaptive=adaptive, timeout=(2, 2), backoff_base=0.2)
+            rows = count_complete_rows(csv_path)
+            print(f"{name:<12} {rows} complete rows  {elapsed:.2f}s  {rows / elapsed:.1f} rows/s  {PageFetcher.stats['retries']} retries")
+    server.shutdown()
+    StubServer.capacity, StubServer.error_rate, StubServer.hang_rate = None, 0.0, 0.0
+    StubServer.page_padding = page_padding
+
+def read_rows(csv_path : str, ignore_columns : tuple = ()):
+    '''
+    Returns the rows of a csv file by app ID, without ignore_columns.
+    '''
+    import csv
+    with open(csv_path, "r", encoding="utf-16", newline="") as csv_file:
+        rows = {}
+        for row in csv.DictReader(csv_file):
+            rows[row["App ID"]] = { column : value for (column, value) in row.items() if column not in ignore_columns }
+        return rows
+
+def benchmark_appdetails():
+    '''
+    Compares bytes transferred and rows per second of scraping every game page with the appdetails API,
+    once without the game pages (the default, no ratings) and once with them as fallback for the ratings.
+    Checks that the API produces the same rows as the pages.
+    '''
+    server, base_url = start_stub_server()
+    modes = {
+        "pages" : { "use_appdetails" : False },
+        "api only" : { "use_appdetails" : True, "fallback_fields" : [] },
+        "api + pages" : { "use_appdetails" : True, "fallback_fields" : ["rating", "ratingCount"] },
+    }
+    print(f"\nappdetails: {benchmark_batches} batches, {benchmark_latency}s latency, batches of {AppDetails.batch_size} app IDs\n")
+    with tempfile.TemporaryDirectory() as directory:
+        for (name, settings) in modes.items():
+            csv_path = os.path.join(directory, f"{name}.csv")
+            elapsed = run_scraper(base_url, csv_path, multithreaded=True, multiprocess=False, asynchronous=False, **settings)
+            rows = count_rows(csv_path)
+            ignore_columns = ("Rating", "Rating count") if settings["use_appdetails"] and len(settings["fallback_fields"]) == 0 else ()
+            reference_rows = read_rows(os.path.join(directory, "pages.csv"), ignore_columns)
+            same_rows = sum(1 for (app_id, row) in read_rows(csv_path, ignore_columns).items() if reference_rows.get(app_id) == row)
+            print(f"{name:<12} {rows} rows ({same_rows} same as pages)  {PageFetcher.stats['requests']} requests  "
+                  f"{PageFetcher.stats['bytes_downloaded'] / 1024**2:.1f} MB  {elapsed:.2f}s  {rows / elapsed:.1f} rows/s")
+    server.shutdown()
+
+def benchmark_memory(batch_sizes : tuple = (25, 100), games : int = 400):
+    '''
+    Measures the peak of the Python heap (tracemalloc) of the engines for the same number of games,
+    split into search pages (batches) of different sizes. An engine that keeps a whole batch of pages
+    in memory grows with the batch size, the streaming engine drops every page once its row is written.
+    Raises an AssertionError if the peak of the streaming engine grows by more than streaming_memory_growth,
+    or if the multiprocess engine (which holds every page of a batch until it is parsed) does not,
+    because then the measurement cannot tell the engines apart.
+    '''
+    import tracemalloc
+    server, base_url = start_stub_server()
+    engines = {
+        "threaded" : { "multithreaded" : True, "multiprocess" : False, "asynchronous" : False },
+        "multiprocess" : { "multithreaded" : False, "multiprocess" : True, "asynchronous" : False },
+        "asyncio"  : { "multithreaded" : False, "multiprocess" : False, "asynchronous" : True },
+        "streaming" : { "multithreaded" : False, "multiprocess" : False, "asynchronous" : False, "streaming" : True },
+    }
+    growths = {}
+    print(f"\nMemory: peak of the Python heap for {games} games, {' / '.join(map(str, batch_sizes))} games per batch\n")
+    with tempfile.TemporaryDirectory() as directory:
+        for (name, settings) in engines.items():
+            peaks = []
+            for batch_size in batch_sizes:
+                csv_path = os.path.join(directory, f"{name}_{batch_size}.csv")
+                tracemalloc.start()
+                run_scraper(base_url, csv_path, batches=games // batch_size, games_per_batch=batch_size, **settings)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            growths[name] = peaks[-1] / peaks[0]
+            print(f"{name:<12} " + "  ".join(f"{peak / 1024**2:.1f} MB" for peak in peaks) + f"  ({growths[name]:.2f}x)")
+    server.shutdown()
+    if growths["streaming"] > streaming_memory_growth:
+        raise AssertionError(f"Peak memory of the streaming engine grows with the batch size: {growths['streaming']:.2f}x")
+    if growths["multiprocess"] <= streaming_memory_growth:
+        raise AssertionError(f"Peak memory of the multiprocess engine does not grow with the batch size ({growths['multiprocess']:.2f}x), the measurement cannot tell the engines apart")
+
+def benchmark_shards(worker_counts : tuple = (1, 2, 4)):
+    '''
+    Scrapes the stub store with 1, 2 and 4 local worker processes of the sharded scraper. Every worker has
+    its own request scheduler (with the default rate limit), like workers on different machines.
+    Before each run, the first shard is leased to a worker that "crashed", to check that expired leases are handed out again.
+    '''
+    import ShardedScraper
+    server, base_url = start_stub_server()
+    print(f"\nShards: {benchmark_batches} batches, {benchmark_latency}s latency, {RequestScheduler.max_requests_per_second:.0f} requests/s per worker\n")
+    saved_settings = { "csv_path" : SteamScraper.csv_path, "store_url" : SteamScraper.store_url, "batches" : SteamScraper.batches,
+                       "verbose" : SteamScraper.verbose, "use_cache" : PageFetcher.use_cache } # run_coordinator applies the settings of every run to this process as well
+    with tempfile.TemporaryDirectory() as directory, overridden_settings(saved_settings):
+        for worker_count in worker_counts:
+            csv_path = os.path.join(directory, f"shards_{worker_count}.csv")
+            ShardedScraper.create_queue(ShardedScraper.get_queue_path(csv_path), benchmark_batches)
+            connection = ShardedScraper.connect(ShardedScraper.get_queue_path(csv_path))
+            lease_time, ShardedScraper.lease_time = ShardedScraper.lease_time, 0
+            ShardedScraper.claim(connection, "crashed")
+            ShardedScraper.lease_time = lease_time
+            connection.close()
+            settings = { "store_url" : base_url, "csv_path" : csv_path, "batches" : benchmark_batches, "verbose" : False, "use_cache" : False }
+            start_time = time.perf_counter()
+            rows = ShardedScraper.run_coordinator(worker_count, settings)
+            elapsed = time.perf_counter() - start_time
+            print(f"{worker_count} workers  {rows} rows  {ShardedScraper.get_status(ShardedScraper.get_queue_path(csv_path))}  {elapsed:.2f}s  {rows / elapsed:.1f} rows/s")
+    server.shutdown()
+
+def benchmark_metrics(repetitions : int = 200):
+    '''
+    Measures the overhead of the stage timers (Metrics.py) on parsing the golden pages with the lxml extractor,
+    the stage with the most timed calls per second.
+    '''
+    pages = load_golden_pages()
+    print(f"\nMetrics: {repetitions} x {len(pages)} golden pages\n")
+    for enabled in (False, True):
+        Metrics.enabled = enabled
+        start_time = time.perf_counter()
+        for _ in range(repetitions):
+            for (_, content, _) in pages:
+                parse_page(content, True)
+        elapsed = time.perf_counter() - start_time
+        print(f"timers {'on ' if enabled else 'off'}  {1e6 * elapsed / (repetitions * len(pages)):.1f} µs per page")
+    Metrics.enabled = True
+
+def benchmark_replay(archive_path : str = None):
+    '''
+    Replays a fixture archive (see Replay.py) through every engine. Without an archive, one is
+    recorded from the stub store first, a real one is recorded with "python Replay.py record".
+    '''
+    import Replay
+    with tempfile.TemporaryDirectory() as directory:
+        if archive_path == None:
+            server, base_url = start_stub_server()
+            archive_path = os.path.join(directory, "StubFixtures.zip")
+            with overridden_settings({ "store_url" : base_url, "verbose" : False }):
+                Replay.record(archive_path, benchmark_batches)
+            server.shutdown()
+            print(f"\nRecorded {benchmark_batches} batches of the stub store: {os.path.getsize(archive_path) / 1024**2:.1f} MB")
+        Replay.benchmark(archive_path)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "golden": # Only the extractor check, e.g. for CI
+        check_golden_pages()
+    else:
+        benchmark_engines()
+        benchmark_cache()
+        benchmark_extractors()
+        benchmark_parse_pool()
+        benchmark_output()
+        benchmark_dataset_cache()
+        benchmark_aggregates()
+        benchmark_history()
+        benchmark_hardware_parser()
+        benchmark_gpu_index()
+        benchmark_gpu_dataset()
+        benchmark_scheduler()
+        benchmark_changes()
+        benchmark_appdetails()
+        benchmark_memory()
+        benchmark_shards()
+        benchmark_metrics()
+        benchmark_replay()
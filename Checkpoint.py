@@ -0,0 +1,160 @@
+import threading
+import hashlib
+import sqlite3
+import time
+import os
+
+import Metrics
+
+''' Settings '''
+resume = True # Whether to continue an interrupted run / only re-scrape stale games instead of starting from scratch
+max_age = 7 * 24 * 3600 # Games scraped less than this many seconds ago are not scraped again
+write_delta = True # Whether every run writes the rows of new and changed games to a delta file next to the csv file (see get_delta_path)
+
+'''
+Checkpoint store for SteamScraper, a small SQLite file next to the csv file.
+It records which batch offsets the current run has completed and when every game (by app ID)
+was scraped last. A crashed run continues at the first incomplete batch, a new run walks all
+search pages again but only fetches the pages of games that are new or older than max_age.
+Within a run, every game is only scraped once, even if the ranking shifts while the search pages are
+walked and the game shows up in two batches.
+The store also keeps a hash of the last row of every game. Rows whose hash changed (or new games)
+are written to a delta file per run, so consumers can apply the changes instead of reloading the csv file.
+'''
+
+connection = None
+lock = threading.Lock()
+run_id = None
+run_started = None
+claimed_apps = set() # App IDs that this run has already handed out for scraping
+
+def get_path(csv_path : str):
+    return os.path.splitext(csv_path)[0] + ".checkpoint.sqlite"
+
+def get_delta_path(csv_path : str, run : int = None):
+    return os.path.splitext(csv_path)[0] + f".delta-{run if run != None else run_id:05}.csv"
+
+def open_store(csv_path : str):
+    '''
+    Opens (or creates) the checkpoint store that belongs to csv_path and starts a run,
+    or continues the last one if it did not finish.
+    '''
+    global connection, run_id, run_started
+    close()
+    connection = sqlite3.connect(get_path(csv_path), check_same_thread=False)
+    connection.executescript('''
+        CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, started REAL, finished REAL, replaced_rows INTEGER DEFAULT 0);
+        CREATE TABLE IF NOT EXISTS batches (run_id INTEGER, offset INTEGER, completed REAL, PRIMARY KEY (run_id, offset));
+        CREATE TABLE IF NOT EXISTS apps (app_id TEXT PRIMARY KEY, scraped REAL);
+        CREATE TABLE IF NOT EXISTS hashes (app_id TEXT PRIMARY KEY, hash BLOB, changed REAL);
+    ''')
+    row = connection.execute("SELECT run_id, started FROM runs WHERE finished IS NULL ORDER BY run_id DESC LIMIT 1").fetchone()
+    if row != None:
+        run_id, run_started = row
+    else:
+        run_started = time.time()
+        run_id = connection.execute("INSERT INTO runs (started) VALUES (?)", (run_started,)).lastrowid
+        connection.commit()
+    claimed_apps.clear()
+
+def close():
+    global connection
+    if connection != None:
+        connection.close()
+        connection = None
+
+def is_batch_completed(offset : int):
+    with lock:
+        row = connection.execute("SELECT 1 FROM batches WHERE run_id = ? AND offset = ?", (run_id, offset)).fetchone()
+    return row != None
+
+def filter_stale(game_infos : list[dict]):
+    '''
+    Returns the games of game_infos that are new or have not been scraped within max_age,
+    and claims them for this run: Games that this run has already scraped or claimed (in another
+    batch, or earlier in game_infos) are skipped, whatever max_age is.
+    '''
+    threshold = min(time.time() - max_age, run_started)
+    stale = []
+    duplicates = 0
+    with lock:
+        for game_info in game_infos:
+            app_id = game_info["app_id"]
+            if app_id in claimed_apps:
+                duplicates += 1
+                continue
+            row = connection.execute("SELECT scraped FROM apps WHERE app_id = ?", (app_id,)).fetchone()
+            if row == None or row[0] < threshold:
+                claimed_apps.add(app_id)
+                stale.append(game_info)
+            elif row[0] >= run_started:
+                duplicates += 1
+    if duplicates > 0:
+        Metrics.count("duplicates_skipped_total", duplicates)
+    return stale
+
+def complete_batch(offset : int, game_infos : list[dict]):
+    '''
+    Marks the batch at offset as completed and game_infos (except the failed ones) as freshly scraped.
+    Call this after the rows have been written.
+    '''
+    now = time.time()
+    with lock:
+        mark_apps(game_infos, now)
+        connection.execute("INSERT OR REPLACE INTO batches (run_id, offset, completed) VALUES (?, ?, ?)", (run_id, offset, now))
+        connection.commit()
+
+def complete_apps(game_infos : list[dict]):
+    '''
+    Marks game_infos as freshly scraped without completing their batch, for engines that write
+    a batch in several parts (see StreamingScraper.py). Call this after the rows have been written.
+    '''
+    with lock:
+        mark_apps(game_infos, time.time())
+        connection.commit()
+
+def mark_apps(game_infos : list[dict], now : float):
+    game_infos = [game_info for game_info in game_infos if not game_info.get("failed")] # Failed games stay stale (see SteamScraper.mark_failed)
+    replaced_rows = 0 # Rows that replace an older row of the same game in the csv file
+    for game_info in game_infos:
+        if connection.execute("SELECT 1 FROM apps WHERE app_id = ?", (game_info["app_id"],)).fetchone() != None:
+            replaced_rows += 1
+    connection.execute("UPDATE runs SET replaced_rows = replaced_rows + ? WHERE run_id = ?", (replaced_rows, run_id))
+    connection.executemany("INSERT OR REPLACE INTO apps (app_id, scraped) VALUES (?, ?)", [(game_info["app_id"], now) for game_info in game_infos])
+
+def detect_changes(rows : list[list], app_id_index : int):
+    '''
+    Compares rows with the hashes of the last rows written for the same games and stores the new hashes.
+    Returns (change, row) for every row of a new game ("added") or with different values ("changed").
+    '''
+    now = time.time()
+    hashes = [(row[app_id_index], get_row_hash(row)) for row in rows]
+    changes = []
+    with lock:
+        for ((app_id, row_hash), row) in zip(hashes, rows):
+            old = connection.execute("SELECT hash FROM hashes WHERE app_id = ?", (app_id,)).fetchone()
+            if old == None:
+                changes.append(("added", row))
+            elif old[0] != row_hash:
+                changes.append(("changed", row))
+        changed_ids = set(row[app_id_index] for (_, row) in changes)
+        connection.executemany("INSERT OR REPLACE INTO hashes (app_id, hash, changed) VALUES (?, ?, ?)",
+                               [(app_id, row_hash, now) for (app_id, row_hash) in hashes if app_id in changed_ids])
+        connection.commit()
+    return changes
+
+def get_row_hash(row : list):
+    return hashlib.blake2b("\x1f".join(str(value) for value in row).encode("utf-8"), digest_size=16).digest()
+
+def has_replaced_rows():
+    '''
+    Whether this run has written rows for games that already had a row in the csv file.
+    '''
+    with lock:
+        row = connection.execute("SELECT replaced_rows FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    return row[0] > 0
+
+def finish_run():
+    with lock:
+        connection.execute("UPDATE runs SET finished = ? WHERE run_id = ?", (time.time(), run_id))
+        connection.commit()
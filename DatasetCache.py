@@ -0,0 +1,169 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import hashlib
+import json
+import csv
+import sys
+import os
+
+import OutputSinks
+import GPUIndex
+
+''' Settings '''
+cache_dir = None # Directory for the cache files, None for next to the dataset
+hash_check = True # Whether a dataset with a new mtime is hashed before its cache is rebuilt, so a touched or copied but unchanged file keeps its cache
+chunk_rows = 50000 # Rows that are converted at once when building the cache from a csv file
+performance_columns = { # Pre-joined GPU performance (GPUIndex.py): new column -> column with the card names
+    "Performance" : "Rec Graphics NVIDIA",
+    "Performance AMD" : "Rec Graphics AMD",
+    "Min Performance" : "Min Graphics NVIDIA",
+    "Min Performance AMD" : "Min Graphics AMD",
+}
+
+'''
+Fast loading of the scraped dataset for SteamAnalysis.ipynb.
+The first load converts SteamData.csv (or the Parquet output) into an uncompressed Arrow IPC file:
+numbers are typed, release dates are parsed, genres and GPU names are dictionary-encoded (pandas
+categoricals) and the GPU performance scores are already joined. Later loads memory-map that file,
+so they neither parse text nor copy the data until it is used.
+The cache is rebuilt when the dataset changes (mtime and size, then a content hash, see hash_check)
+or when the GPU tables of GPUIndex.py change.
+
+    games = DatasetCache.load("SteamData.csv")        pandas DataFrame
+    table = DatasetCache.load_table("SteamData.csv")  memory-mapped pyarrow Table
+'''
+
+def get_cache_path(source_path : str):
+    directory, file_name = os.path.split(os.path.abspath(source_path))
+    return os.path.join(cache_dir or directory, file_name + ".cache.arrow") # SteamData.csv and SteamData.parquet get separate caches
+
+def get_meta_path(cache_path : str):
+    return cache_path + ".json"
+
+def hash_file(path : str, block_size : int = 1 << 20):
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as source_file:
+        while block := source_file.read(block_size):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+def get_gpu_tables():
+    '''
+    mtimes of the GPU tables, the pre-joined performances are only valid as long as these stay the same.
+    '''
+    tables = {}
+    for path in GPUIndex.gpu_tables:
+        path = GPUIndex.get_path(path)
+        tables[os.path.basename(path)] = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    return tables
+
+def get_fingerprint(source_path : str, file_hash : str = None):
+    stat = os.stat(source_path)
+    return { "mtime" : stat.st_mtime_ns, "size" : stat.st_size, "hash" : file_hash or hash_file(source_path), "gpu_tables" : get_gpu_tables() }
+
+def is_valid(source_path : str):
+    '''
+    Whether the cache of source_path exists and was built from the current dataset and GPU tables.
+    '''
+    cache_path = get_cache_path(source_path)
+    if not os.path.exists(cache_path) or not os.path.exists(get_meta_path(cache_path)):
+        return False
+    with open(get_meta_path(cache_path), "r", encoding="utf-8") as meta_file:
+        meta = json.load(meta_file)
+    stat = os.stat(source_path)
+    if stat.st_size != meta["size"] or meta["gpu_tables"] != get_gpu_tables():
+        return False
+    if stat.st_mtime_ns == meta["mtime"]:
+        return True
+    if not hash_check or hash_file(source_path) != meta["hash"]:
+        return False
+    write_meta(cache_path, get_fingerprint(source_path, meta["hash"])) # Same content, remember the new mtime so it is not hashed again
+    return True
+
+def write_meta(cache_path : str, fingerprint : dict):
+    with open(get_meta_path(cache_path) + ".tmp", "w", encoding="utf-8") as meta_file:
+        json.dump(fingerprint, meta_file)
+    os.replace(get_meta_path(cache_path) + ".tmp", get_meta_path(cache_path))
+
+# ----------------------------------------
+
+def read_source(source_path : str):
+    '''
+    Reads the dataset into a typed arrow table (see OutputSinks.column_types), from Parquet or from the csv file in chunks.
+    '''
+    if source_path.endswith(".parquet"):
+        return pq.read_table(source_path)
+    tables = []
+    with open(source_path, "r", encoding="utf-16", newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        column_names = next(reader)
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) == chunk_rows:
+                tables.append(OutputSinks.to_table(rows, column_names))
+                rows = []
+        tables.append(OutputSinks.to_table(rows, column_names))
+    return pa.concat_tables(tables)
+
+def join_performance(cards : pa.DictionaryArray):
+    '''
+    Resolves every distinct card of a dictionary-encoded column once and spreads the scores over the rows.
+    '''
+    performances = pa.array([GPUIndex.resolve(card) for card in cards.dictionary.to_pylist()], type=pa.float64())
+    return pc.take(performances, cards.indices)
+
+def prepare_table(table : pa.Table):
+    '''
+    One chunk and one dictionary per column (so the file can be memory-mapped as a whole), release dates
+    as timestamps (datetime64 in pandas) and the performance columns.
+    '''
+    table = table.unify_dictionaries().combine_chunks()
+    if "Release date" in table.column_names:
+        index = table.column_names.index("Release date")
+        table = table.set_column(index, "Release date", pc.cast(table["Release date"], pa.timestamp("ns")))
+    for (name, cards_column) in performance_columns.items():
+        if cards_column in table.column_names and name not in table.column_names:
+            table = table.append_column(name, join_performance(table[cards_column].chunk(0)) if table.num_rows > 0 else pa.array([], type=pa.float64()))
+    return table
+
+def build(source_path : str):
+    '''
+    Converts source_path into its cache file. Returns the path of the cache file.
+    '''
+    fingerprint = get_fingerprint(source_path) # Before reading, so changes during the build invalidate the cache
+    cache_path = get_cache_path(source_path)
+    table = prepare_table(read_source(source_path))
+    with pa.OSFile(cache_path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(cache_path + ".tmp", cache_path)
+    write_meta(cache_path, fingerprint)
+    return cache_path
+
+def load_table(source_path : str):
+    '''
+    Returns the dataset as a memory-mapped arrow table, (re)building the cache first if necessary.
+    '''
+    if not is_valid(source_path):
+        build(source_path)
+    with pa.memory_map(get_cache_path(source_path), "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+def load(source_path : str, columns : list[str] = None):
+    '''
+    Returns the dataset (or only columns) as a pandas DataFrame with categorical genres and GPUs,
+    datetime release dates and the performance columns.
+    '''
+    table = load_table(source_path)
+    if columns != None:
+        table = table.select(columns)
+    return table.to_pandas()
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python DatasetCache.py <SteamData.csv or .parquet>")
+    elif is_valid(sys.argv[1]):
+        print(f"Cache is up to date: {get_cache_path(sys.argv[1])}")
+    else:
+        print(f"Cache built: {build(sys.argv[1])}")
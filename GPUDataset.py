@@ -0,0 +1,209 @@
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree
+import lxml.html
+import numpy as np
+import argparse
+import regex
+import csv
+import os
+
+import PageFetcher
+import GPUIndex
+
+''' Settings '''
+web_sources = { # Benchmark websites, every source is a list of pages with scores on the same scale
+    "videocardbenchmark.net" : ["https://www.videocardbenchmark.net/high_end_gpus.html"], # mid_range_gpus.html and low_end_gpus.html are on the same scale
+}
+output_tables = { "nvidia" : "NvidiaGPUs.csv", "amd" : "AmdGPUs.csv" } # (Relative) Paths of the tables for every vendor (see GPUIndex.gpu_tables)
+max_workers = 8 # For fetching the pages of the web sources concurrently
+
+'''
+Builds the GPU performance tables (NvidiaGPUs.csv, AmdGPUs.csv) and the binary lookup table of GPUIndex.py.
+Replaces the loops of GPUDatasetCreation.ipynb: The pages of all web sources are fetched concurrently
+(through PageFetcher.py, so they are cached and rate-limited), the scores of every source are scaled
+to 1 - 10 with NumPy, and the cards of all sources are merged in one pass over a dict of normalized
+card keys (GPUIndex.get_key), so "GTX 1060 Mobile" and "GeForce GTX 1060 [Laptop]" count as the same card.
+Earlier sources win, like in the notebook.
+
+    python GPUDataset.py                       Builds everything from the static and the web sources
+    python GPUDataset.py --offline --output-dir built   Only the static sources, into the directory built
+    python GPUDataset.py --offline --vendors amd --force   Only the static sources, replaces AmdGPUs.csv
+'''
+
+# Hand-copied benchmark tables from GPUDatasetCreation.ipynb, every list is on its own scale
+static_sources = {
+    "static_nvidia" : (
+        ["GeForce RTX 3090 Ti","GeForce RTX 3090","GeForce RTX 3080 Ti","GeForce RTX 3080",
+         "GeForce Quadro RTX A6000","GeForce Quadro RTX A5000","GeForce RTX 3070 Ti","GeForce Titan V",
+         "GeForce RTX 3070","GeForce RTX 3080 [Laptop]","GeForce RTX 2080 Ti","GeForce RTX Titan",
+         "GeForce RTX 3060 Ti","GeForce RTX 3070 [Laptop]","GeForce RTX 3060","GeForce Titan Pascal",
+         "GeForce RTX 2080 SUPER","GeForce RTX 3060 [Laptop]","GeForce GTX 1080 Ti","GeForce RTX 2080",
+         "GeForce Quadro RTX A4000","GeForce RTX 2070 SUPER","GeForce RTX 2070","GeForce RTX 2060 SUPER",
+         "GeForce RTX 2060","GeForce GTX 1080","GeForce RTX 3050","GeForce GTX 1070 Ti",
+         "GeForce RTX 3050 Ti [Laptop]","GeForce GTX 980 Ti","GeForce GTX 1070","GeForce GTX 1660 Ti",
+         "GeForce GTX 1660 SUPER","GeForce RTX 3050 [Laptop]","GeForce GTX 1660","GeForce GTX 1060",
+         "GeForce GTX 980","GeForce GTX 1650 SUPER","GeForce GTX 1650","GeForce GTX 1050 Ti","GeForce GTX 960",
+         "GeForce GTX 1050"],
+        [953,912,874,792,747,696,597,567,557,529,518,517,498,482,382,374,365,355,350,347,333,
+         332,317,302,255,252,251,247,229,215,210,206,206,205,181,152,152,140,119,86,80,74]),
+    "static_mixed" : (
+        ["RTX 4090","RTX 4080 Ti","RTX 4080","RTX 4070","RTX 3090","RX 6900 XT","RTX 3080 Ti","RX 6800 XT",
+         "RTX 3080","RTX 4060 Ti","RTX 4060","RX 6800","RTX 3070 Ti","TITAN RTX","RTX 3070","RTX 2080 Ti",
+         "RX 6700 XT","RTX 3060 Ti","RTX 2080 SUPER","TITAN V","RTX 2080","RX 6600 XT","RTX 4050","RTX 2070 SUPER",
+         "GTX 1080 Ti","TITAN Xp","Radeon VII","RTX 3060","RX 5700 XT","RTX 2070","RX 5700","RTX 2060 SUPER",
+         "GTX 1080","RX 5600 XT","RTX 2060","RX Vega 64","GTX 1070 Ti","RX Vega 56","GTX TITAN X","RTX 3050 Ti",
+         "RTX 2080 Mobile","GTX 1660 Ti","R9 295X2","RTX 3050","GTX 1070","GTX 1660 SUPER","GTX 1080 Mobile",
+         "GTX 1660","RTX 2080 Max-Q","RTX 2070 Mobile","GTX 1660 Ti Mobile","GTX 1080 Max-Q","GTX 1070 Mobile",
+         "GTX 980 Ti","R9 FURY X","RX 590","RTX 2060 Mobile","RTX 2070 Max-Q","R9 Nano","GTX 1070 Max-Q","GTX 980",
+         "RX 5500 XT 8GB","RX Vega 56 Mobile","GTX 1660 Ti Max-Q","R9 FURY","RX 5500 XT 4GB","RX 580","GTX 1650 SUPER",
+         "GTX 1060 6GB","GTX TITAN BLACK","RX 480","GTX 1060 3GB","Radeon HD 7990","R9 390X","GTX 780 Ti","RX 570",
+         "GTX TITAN","GTX 970","R9 290X","R9 390","GTX 1650","GTX 1060 Mobile","R9 290","RX 470","GTX 980M",
+         "GTX 980 Mobile","GTX 980MX","GTX 780","GTX 1060 Max-Q","RX 580 Mobile","RX 580X Mobile","Pro WX 7100 Mobile",
+         "R9 380X","RX 480 Mobile","R9 280X","RX 570 Mobile","GTX 770","GTX 970M 6GB","GTX 970M","GTX 1650 Max-Q",
+         "GTX 1650 Mobile","GTX 1050 Ti","R9 285","R9 380","R9 M290X","R9 280","RX 470 Mobile","GTX 960","GTX 1050 Ti Mobile",
+         "GTX 780M","GTX 780M","GTX 760","GTX 1050","R9 270","GTX 950","RX 560"],
+        [430,401,373,344,287,285,283,276,275,265,235,230,225,223,220,213,200,186,184,180,
+         170,165,159,156,156,154,150,150,148,145,137,136,130,127,126,124,123,120,120,120,
+         119,118,118,115,114,114,110,110,102,101,100,97,97,93,92,91,88,87,87,86,85,85,84,
+         83,82,80,79,79,78,77,75,75,74,74,73,73,72,71,70,70,70,66,65,64,59,59,59,58,58,55,
+         55,55,52,52,52,51,50,49,49,48,48,48,46,46,45,45,45,45,41,41,41,40,39,38,36,33]),
+}
+
+nvidia_regex = regex.compile(r"\b(geforce|gtx|rtx|titan|quadro|nvidia)\b", regex.IGNORECASE)
+amd_regex = regex.compile(r"\b(radeon|rx|r[579]|vega|fury|nano|firepro|pro wx|amd)\b", regex.IGNORECASE) # "HD" alone is also Intel (HD Graphics 630)
+vendor_prefixes = { "nvidia" : "GeForce ", "amd" : "Radeon " } # The tables name every card with the brand, like the notebook did
+
+xpath_card_names = etree.XPath("(//ul[contains(concat(' ', normalize-space(@class), ' '), ' chartlist ')])[1]//span[@class='prdname']")
+xpath_card_score = etree.XPath("ancestor::li[1]//span[@class='count']")
+
+def fetch_web_sources(sources : dict = None):
+    '''
+    Fetches the pages of all web sources concurrently.
+    Returns { source : (card names, scores) }, sources with a page that failed are left out.
+    '''
+    sources = web_sources if sources == None else sources
+    pages = [(source, url) for (source, urls) in sources.items() for url in urls]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        contents = list(executor.map(fetch_page, [url for (_, url) in pages]))
+    failed = set(source for ((source, _), content) in zip(pages, contents) if content == None)
+    results = {}
+    for ((source, url), content) in zip(pages, contents):
+        if source in failed:
+            continue
+        names, scores = results.setdefault(source, ([], []))
+        page_names, page_scores = parse_chart_page(content)
+        names.extend(page_names)
+        scores.extend(page_scores)
+    return results
+
+def fetch_page(url : str):
+    try:
+        return PageFetcher.fetch(url)
+    except Exception as e:
+        print(f"Failed to get {url}: {e}")
+        return None
+
+def parse_chart_page(content : bytes):
+    '''
+    Parses a chart page of videocardbenchmark.net into card names and scores.
+    '''
+    root = lxml.html.fromstring(content)
+    names, scores = [], []
+    for name_span in xpath_card_names(root):
+        score_spans = xpath_card_score(name_span)
+        score = score_spans[0].text_content().replace(",", "").strip() if len(score_spans) > 0 else ""
+        if name_span.text_content().strip() and score.replace(".", "", 1).isdigit():
+            names.append(name_span.text_content().strip())
+            scores.append(float(score))
+    return names, scores
+
+# ----------------------------------------
+
+def normalize(scores, new_min : float = 1.0, new_max : float = 10.0):
+    '''
+    Scales scores linearly to new_min - new_max: new_min + (new_max - new_min) / (old_max - old_min) * (value - old_min)
+    '''
+    scores = np.asarray(scores, dtype=np.float64)
+    old_min, old_max = scores.min(), scores.max()
+    if old_max == old_min:
+        return np.full(len(scores), new_max)
+    return new_min + (new_max - new_min) / (old_max - old_min) * (scores - old_min)
+
+def get_vendor(name : str):
+    if nvidia_regex.search(name):
+        return "nvidia"
+    if amd_regex.search(name):
+        return "amd"
+    return None
+
+def get_display_name(name : str, vendor : str):
+    prefix = vendor_prefixes[vendor]
+    return name if name.lower().startswith(prefix.strip().lower()) else prefix + name
+
+def merge_sources(sources : dict, vendors : list[str]):
+    '''
+    Normalizes every source and merges them into { vendor : (card names, performances) }, sorted by performance.
+    A card that is in several sources (by its GPUIndex key) keeps the performance of the first one.
+    '''
+    cards = { vendor : {} for vendor in vendors } # vendor -> { key : (display name, performance) }
+    for (names, scores) in sources.values():
+        if len(names) == 0:
+            continue
+        for (name, performance) in zip(names, normalize(scores).tolist()):
+            vendor = get_vendor(name)
+            if vendor not in cards:
+                continue
+            display_name = get_display_name(name, vendor)
+            cards[vendor].setdefault(GPUIndex.get_key(display_name), (display_name, performance))
+    tables = {}
+    for (vendor, vendor_cards) in cards.items():
+        names = np.array([name for (name, _) in vendor_cards.values()], dtype=object)
+        performances = np.array([performance for (_, performance) in vendor_cards.values()], dtype=np.float64)
+        order = np.argsort(-performances, kind="stable")
+        tables[vendor] = (names[order].tolist(), performances[order].tolist())
+    return tables
+
+def write_table(path : str, names : list[str], performances : list[float]):
+    with open(path + ".tmp", "w", encoding="utf-8", newline="") as table_file:
+        writer = csv.writer(table_file, lineterminator="\n")
+        writer.writerow(["Card", "Performance"])
+        writer.writerows(zip(names, performances))
+    os.replace(path + ".tmp", path)
+
+def build(offline : bool = False, vendors : list[str] = None, output_dir : str = None, force : bool = False):
+    '''
+    Builds the tables of vendors (all of output_tables by default) from the static sources and,
+    unless offline, the web sources. Then rebuilds the binary lookup table of GPUIndex from all tables
+    in output_dir (next to this file by default) and writes it there as well.
+    Without all web sources (offline or a source failed), the tables would be shorter, so existing tables
+    are only replaced with force.
+    Returns { vendor : number of cards } of the tables that were written.
+    '''
+    vendors = vendors or list(output_tables)
+    output_dir = output_dir or os.path.dirname(os.path.abspath(__file__))
+    sources = dict(static_sources)
+    web_results = {} if offline else fetch_web_sources()
+    sources.update(web_results)
+    complete = set(web_results) == set(web_sources)
+    tables = merge_sources(sources, vendors)
+    written = {}
+    for (vendor, (names, performances)) in tables.items():
+        path = os.path.join(output_dir, output_tables[vendor])
+        if not complete and not force and os.path.exists(path):
+            print(f"Not replacing {path} without all web sources (use --force or another --output-dir)")
+            continue
+        write_table(path, names, performances)
+        written[vendor] = len(names)
+    if len(written) > 0 and GPUIndex.lookup_table != None:
+        GPUIndex.save_lookup_table(os.path.join(output_dir, GPUIndex.lookup_table), [os.path.join(output_dir, table) for table in output_tables.values()])
+    return written
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Builds the GPU performance tables and the lookup table of GPUIndex.py")
+    parser.add_argument("--offline", action="store_true", help="only use the static sources")
+    parser.add_argument("--vendors", nargs="+", choices=list(output_tables), help="only build the tables of these vendors")
+    parser.add_argument("--output-dir", help="directory of the tables and the lookup table (default: next to this file)")
+    parser.add_argument("--force", action="store_true", help="replace existing tables even without all web sources")
+    arguments = parser.parse_args()
+    for (vendor, card_count) in build(arguments.offline, arguments.vendors, arguments.output_dir, arguments.force).items():
+        print(f"{output_tables[vendor]}: {card_count} cards")
@@ -0,0 +1,166 @@
+from functools import lru_cache
+import regex
+import csv
+import os
+
+import HardwareParser
+
+''' Settings '''
+gpu_tables = ["NvidiaGPUs.csv", "AmdGPUs.csv"] # Tables of cards and their performance (columns "Card" and "Performance"). Missing tables are skipped.
+cache_size = 65536 # How many distinct card strings to remember
+lookup_table = "GPUs.npz" # Binary copy of the index written by GPUDataset.py. Loaded instead of gpu_tables while it is newer than all of them. None to always read gpu_tables.
+
+'''
+Index of GPU performance scores for resolving the cards that HardwareParser extracts from the system requirements.
+Card names are normalized into keys of tokens ("NVIDIA GeForce GTX1060 6GB" -> gtx 1060 + 6gb), so small
+variations in spelling still match. Every card is indexed once under its full key and under shorter aliases
+(without memory size, without the family), so resolving a name is a few dict lookups instead of a fuzzy
+search over the whole table.
+The finished index can be saved as a binary lookup table (save_lookup_table), which loads without
+reading the csv files or normalizing any card names.
+'''
+
+token_regex = regex.compile(r"[a-z]+|[0-9]+")
+noise_tokens = { "nvidia", "geforce", "amd", "ati", "radeon", "graphics", "card", "series", "with", "design", "gpu", "edition", "or", "better", "equivalent" }
+variant_tokens = { "mobile" : "mobile", "laptop" : "mobile", "m" : "mobile", "notebook" : "mobile", "oem" : "oem" }
+memory_units = { "gb", "mb", "g" }
+
+index = None # key -> performance
+
+def get_key(name : str):
+    '''
+    Normalizes a card name into (core tokens, variants, memory), e.g.
+    "GeForce GTX 1060 6GB" -> (("gtx", "1060"), (), "6gb"), "GeForce RTX 2080 Max-Q" -> (("rtx", "2080"), ("maxq",), "")
+    '''
+    tokens = token_regex.findall(name.lower())
+    core, variants, memory = [], set(), ""
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        next_token = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if token.isdigit() and next_token in memory_units and len(core) > 0:
+            memory = token + ("mb" if next_token == "mb" else "gb")
+            i += 2
+            continue
+        if token == "max" and next_token == "q":
+            variants.add("maxq")
+            i += 2
+            continue
+        if token in variant_tokens:
+            variants.add(variant_tokens[token])
+        elif token not in noise_tokens:
+            core.append(token)
+        i += 1
+    return tuple(core), tuple(sorted(variants)), memory
+
+def get_aliases(key : tuple):
+    '''
+    Shorter keys that a card can also be found under, from most to least specific.
+    '''
+    core, variants, memory = key
+    aliases = []
+    if memory:
+        aliases.append((core, variants, ""))
+    if len(core) > 1 and not core[0].isdigit():
+        aliases.append((core[1:], variants, memory))
+        if memory:
+            aliases.append((core[1:], variants, ""))
+    return aliases
+
+def get_path(path : str):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+
+def is_lookup_table_fresh():
+    if lookup_table == None or not os.path.exists(get_path(lookup_table)):
+        return False
+    table_mtimes = [os.path.getmtime(get_path(path)) for path in gpu_tables if os.path.exists(get_path(path))]
+    return os.path.getmtime(get_path(lookup_table)) >= max(table_mtimes, default=0)
+
+def load(paths : list[str] = None):
+    '''
+    Builds the index from the GPU tables (or from the lookup table, if paths is None and it is fresh). Called automatically by resolve.
+    Full keys win over aliases, and an alias that fits several cards with different scores is dropped.
+    '''
+    global index
+    if paths == None and is_lookup_table_fresh():
+        load_lookup_table()
+        return
+    cards = [] # (key, performance)
+    for path in (paths if paths != None else gpu_tables):
+        path = get_path(path)
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8", newline="") as table_file:
+            for row in csv.DictReader(table_file):
+                cards.append((get_key(row["Card"]), float(row["Performance"])))
+    new_index = {}
+    for (key, performance) in cards:
+        new_index.setdefault(key, performance)
+    aliases = {}
+    ambiguous = set()
+    for (key, performance) in cards:
+        for alias in get_aliases(key):
+            if alias in new_index:
+                continue
+            if alias in aliases and aliases[alias] != performance:
+                ambiguous.add(alias)
+            aliases.setdefault(alias, performance)
+    for alias in ambiguous:
+        del aliases[alias]
+    new_index.update(aliases)
+    index = new_index
+    resolve_cached.cache_clear()
+
+def serialize_key(key : tuple):
+    core, variants, memory = key
+    return " ".join(core) + "|" + " ".join(variants) + "|" + memory
+
+def deserialize_key(text : str):
+    core, variants, memory = text.split("|")
+    return tuple(core.split()), tuple(variants.split()), memory
+
+def save_lookup_table(path : str = None, tables : list[str] = None):
+    '''
+    Builds the index from tables (gpu_tables by default) and saves it (aliases included) to path (lookup_table by default):
+    a NumPy archive with the keys as strings ("gtx 1060||6gb") and the performances as float64.
+    '''
+    import numpy as np
+    load(tables or gpu_tables)
+    path = get_path(path or lookup_table)
+    with open(path + ".tmp", "wb") as table_file:
+        np.savez_compressed(table_file, keys=np.array([serialize_key(key) for key in index], dtype=str),
+                            performances=np.array(list(index.values()), dtype=np.float64))
+    os.replace(path + ".tmp", path)
+
+def load_lookup_table(path : str = None):
+    global index
+    import numpy as np
+    with np.load(get_path(path or lookup_table)) as table:
+        index = dict(zip(map(deserialize_key, table["keys"].tolist()), table["performances"].tolist()))
+    resolve_cached.cache_clear()
+
+def resolve(name : str):
+    '''
+    Returns the performance score of a card name, None if it is not in the index.
+    '''
+    if not isinstance(name, str) or name.strip() == "":
+        return None
+    return resolve_cached(name.strip())
+
+@lru_cache(maxsize=cache_size)
+def resolve_cached(name : str):
+    if index == None:
+        load()
+    core, variants, memory = get_key(name)
+    for key in ((core, variants, memory), (core, variants, "")): # A name without a family ("GeForce 1070") directly hits an alias
+        if key in index:
+            return index[key]
+    return None
+
+def resolve_batch(names):
+    '''
+    resolve for a whole list or pandas Series of card names. Every distinct name is only resolved once.
+    Returns a list (or a Series with the same index, NaN for unknown cards).
+    '''
+    performances = HardwareParser.map_distinct(resolve, names, None)
+    return performances.astype(float) if hasattr(performances, "astype") else performances
@@ -1,16 +1,161 @@
 import regex
+from functools import lru_cache
+from enum import IntEnum
+
+''' Settings '''
+cache_size = 65536 # How many distinct requirement strings to remember. The same GPU strings repeat across thousands of games.
+
+nvidia_regex = regex.compile(r"(?:GeForce)*\s{0,1}(?:GTX|RTX)\s[0-9]{1,4}\s{0,1}(?:Ti|SUPER)*")
+amd_regex = regex.compile(r"(?:Radeon)*\s{0,1}(?:RX)\s{0,1}[0-9]{0,4}\s{0,1}(?:XT)*")
 
 def process_graphics_regex(graphics : str):
-    nvidiaPattern = "(?:GeForce)*\s{0,1}(?:GTX|RTX)\s[0-9]{1,4}\s{0,1}(?:Ti|SUPER)*"
-    amdPattern = "(?:Radeon)*\s{0,1}(?:RX)\s{0,1}[0-9]{0,4}\s{0,1}(?:XT)*"
-    nvidiaMatches = regex.findall(nvidiaPattern, graphics)
-    amdMatches = regex.findall(amdPattern, graphics)
-    nvidia = nvidiaMatches[0].strip() if len(nvidiaMatches) > 0 else ""
-    amd = amdMatches[0].strip() if len(amdMatches) > 0 else ""
+    '''
+    Extracts the first NVIDIA and AMD graphics card from a requirement string.
+    Returns (nvidia, amd), empty strings if there is none.
+    '''
+    if graphics == None:
+        return "", ""
+    return process_graphics_regex_cached(graphics.strip()) # Surrounding whitespace never changes the result
+
+@lru_cache(maxsize=cache_size)
+def process_graphics_regex_cached(graphics : str):
+    nvidiaMatch = nvidia_regex.search(graphics)
+    amdMatch = amd_regex.search(graphics)
+    nvidia = nvidiaMatch.group().strip() if nvidiaMatch != None else ""
+    amd = amdMatch.group().strip() if amdMatch != None else ""
     if len(nvidia) > 0 and not nvidia.startswith("GeForce"):
         nvidia = "GeForce " + nvidia
     return nvidia, amd
 
+def process_graphics_regex_batch(graphics):
+    '''
+    process_graphics_regex for a whole list or pandas Series of requirement strings at once.
+    Every distinct string is only parsed once.
+    Returns two lists (or two Series with the same index): nvidia, amd
+    '''
+    nvidia = map_distinct(lambda value: process_graphics_regex(value)[0], graphics, "")
+    amd = map_distinct(lambda value: process_graphics_regex(value)[1], graphics, "") # Answered from the cache of the first pass
+    return nvidia, amd
+
+def map_distinct(function, values, missing):
+    '''
+    function applied to every entry of a list or pandas Series, but only called once for every distinct value.
+    Returns a list, or for a Series an object Series with the same index (missing for missing values).
+    '''
+    if hasattr(values, "factorize") and hasattr(values, "index"): # pandas Series, without importing pandas here
+        import numpy as np
+        codes, uniques = values.factorize()
+        results = np.empty(len(uniques) + 1, dtype=object)
+        for (i, value) in enumerate(uniques):
+            results[i] = function(value)
+        results[-1] = missing # Missing values have code -1, so they get the last entry
+        return type(values)(results[codes], index=values.index)
+    results = { value : function(value) for value in set(values) }
+    return [results[value] for value in values]
+
+# ----------------------------------------
+
+size_regex = regex.compile(r"([0-9]+(?:[.,][0-9]+)?)\s*(TB|GB|MB|G|M)\b", regex.IGNORECASE)
+size_units = { "tb" : 1024 * 1024, "gb" : 1024, "g" : 1024, "mb" : 1, "m" : 1 }
+intel_regex = regex.compile(r"\b(?:Core\s*)?i([3579])(?:\s*-\s*|\s+)?([0-9]{3,5}[A-Z]{0,2})?\b|\bCore\s*2\s*(Duo|Quad)\b", regex.IGNORECASE)
+amd_cpu_regex = regex.compile(r"\bRyzen\s*([3579])(?:\s+([0-9]{4}[A-Z0-9]{0,3}))?\b|\bFX\s*-?\s*([0-9]{4})\b", regex.IGNORECASE)
+windows_regex = regex.compile(r"\b(xp|vista|11|10|8\.1|8|7)\b", regex.IGNORECASE)
+
+class WindowsVersion(IntEnum):
+    UNKNOWN = 0
+    XP = 1
+    VISTA = 2
+    WIN7 = 3
+    WIN8 = 4
+    WIN8_1 = 5
+    WIN10 = 6
+    WIN11 = 7
+
+windows_versions = { "xp" : WindowsVersion.XP, "vista" : WindowsVersion.VISTA, "7" : WindowsVersion.WIN7, "8" : WindowsVersion.WIN8,
+                     "8.1" : WindowsVersion.WIN8_1, "10" : WindowsVersion.WIN10, "11" : WindowsVersion.WIN11 }
+
+def process_sys_reqs(sys_reqs : dict):
+    '''
+    Turns the free text system requirements of a game into compact, comparable values.
+    Returns a dict with "OS Version", "Processor Intel", "Processor AMD", "Graphics NVIDIA", "Graphics AMD",
+    "Memory MB" and "Storage MB" (None if the text does not say).
+    '''
+    processor_intel, processor_amd = process_processor(sys_reqs.get("Processor"))
+    graphics_nvidia, graphics_amd = process_graphics_regex(sys_reqs.get("Graphics"))
+    return {
+        "OS Version" : process_os(sys_reqs.get("OS")),
+        "Processor Intel" : processor_intel,
+        "Processor AMD" : processor_amd,
+        "Graphics NVIDIA" : graphics_nvidia,
+        "Graphics AMD" : graphics_amd,
+        "Memory MB" : process_size(sys_reqs.get("Memory")),
+        "Storage MB" : process_size(sys_reqs.get("Storage")),
+    }
+
+def process_size(size : str):
+    '''
+    "8 GB RAM" -> 8192, "500 MB available space" -> 500
+    Returns the first size in size in MB, None if there is none.
+    '''
+    if size == None:
+        return None
+    return process_size_cached(size.strip())
+
+@lru_cache(maxsize=cache_size)
+def process_size_cached(size : str):
+    match = size_regex.search(size)
+    if match == None:
+        return None
+    return round(float(match.group(1).replace(",", ".")) * size_units[match.group(2).lower()])
+
+def process_processor(processor : str):
+    '''
+    Extracts the first Intel and AMD CPU from a requirement string in a canonical form,
+    e.g. "Intel® Core™ i5-2500K @ 3.3GHz / AMD FX-8350" -> ("Intel Core i5-2500K", "AMD FX-8350").
+    Returns (intel, amd), empty strings if there is none.
+    '''
+    if processor == None:
+        return "", ""
+    return process_processor_cached(processor.strip())
+
+@lru_cache(maxsize=cache_size)
+def process_processor_cached(processor : str):
+    processor = processor.replace("™", " ").replace("®", " ").replace("(R)", " ").replace("(TM)", " ")
+    intel, amd = "", ""
+    intelMatch = intel_regex.search(processor)
+    if intelMatch != None:
+        if intelMatch.group(3) != None:
+            intel = f"Intel Core 2 {intelMatch.group(3).capitalize()}"
+        elif intelMatch.group(2) != None:
+            intel = f"Intel Core i{intelMatch.group(1)}-{intelMatch.group(2).upper()}"
+        else:
+            intel = f"Intel Core i{intelMatch.group(1)}"
+    amdMatch = amd_cpu_regex.search(processor)
+    if amdMatch != None:
+        if amdMatch.group(3) != None:
+            amd = f"AMD FX-{amdMatch.group(3)}"
+        elif amdMatch.group(2) != None:
+            amd = f"AMD Ryzen {amdMatch.group(1)} {amdMatch.group(2).upper()}"
+        else:
+            amd = f"AMD Ryzen {amdMatch.group(1)}"
+    return intel, amd
+
+def process_os(os : str):
+    '''
+    Maps an OS requirement to the oldest Windows version it names,
+    e.g. "Windows® 7 SP1 / 8.1 / 10 (64-bit)" -> WindowsVersion.WIN7
+    '''
+    if os == None:
+        return WindowsVersion.UNKNOWN
+    return process_os_cached(os.strip())
+
+@lru_cache(maxsize=cache_size)
+def process_os_cached(os : str):
+    versions = [windows_versions[match.lower()] for match in windows_regex.findall(os)]
+    return min(versions) if len(versions) > 0 else WindowsVersion.UNKNOWN
+
+# ----------------------------------------
+
 def process_graphics(graphics : str):
     graphics = graphics.lower()
     nvidia, amd = "", ""
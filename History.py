@@ -0,0 +1,203 @@
+from datetime import datetime, date
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import sqlite3
+import time
+import sys
+import os
+
+''' Settings '''
+flush_rows = 5000 # Observations that are buffered before they are written as a part file. An interrupted run loses at most this many.
+
+'''
+Append-only history of prices and ratings across scrape runs. Every run records the price, rating
+and rating count of the games it scraped, but only where they changed since the last observation:
+A value that stays the same is not stored again (run-length encoding over time), and the rating count,
+which grows a little with every run, is stored as the difference to the last count (delta encoding).
+The changes are written as small typed Parquet files, partitioned by date:
+
+    <store>/date=2026-10-17/part-000042.parquet   app_id uint32, price_cents int32, rating float32, rating_count_delta int32, first bool
+
+Nulls mean "unchanged", first marks the first observation of a game. A SQLite manifest next to the
+partitions knows the parts of every date, the last values of every game (to find the changes of a new run)
+and which parts changed the price or rating of which game, so a history query reads only the parts that
+changed that game and a range query only the dates in the range.
+The history is an output sink of SteamScraper (output_sinks = { "history" : "SteamHistory" }).
+
+    python History.py SteamHistory price 570                        Price history of app 570
+    python History.py SteamHistory ratings 2026-10-01 2026-10-17   Games whose rating changed in the range
+'''
+
+fields = ("price", "rating", "rating_count")
+indexed_fields = ("price", "rating") # Fields whose changes are indexed per game. Rating counts change in almost every run, an index would be as big as the history.
+columns = { "price" : "price_cents", "rating" : "rating", "rating_count" : "rating_count_delta" } # field -> column in the part files
+schema = pa.schema([("app_id", pa.uint32()), ("price_cents", pa.int32()), ("rating", pa.float32()), ("rating_count_delta", pa.int32()), ("first", pa.bool_())])
+
+def connect(store_dir : str):
+    os.makedirs(store_dir, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(store_dir, "manifest.sqlite"), check_same_thread=False)
+    connection.executescript('''
+        CREATE TABLE IF NOT EXISTS parts (part_id INTEGER PRIMARY KEY, time REAL, date TEXT, path TEXT, rows INTEGER);
+        CREATE INDEX IF NOT EXISTS parts_date ON parts (date);
+        CREATE TABLE IF NOT EXISTS last (app_id INTEGER PRIMARY KEY, price REAL, rating REAL, rating_count INTEGER);
+        CREATE TABLE IF NOT EXISTS changes (app_id INTEGER, field TEXT, part_id INTEGER, PRIMARY KEY (app_id, field, part_id)) WITHOUT ROWID;
+    ''')
+    return connection
+
+def parse_observation(app_id : str, price : str, rating : str, rating_count : str):
+    '''
+    (app_id, price, rating, rating count) from the csv strings, None for values that are missing.
+    Returns None if the app ID is not a number.
+    '''
+    def parse(text : str, number_type : type):
+        try:
+            return number_type(text.replace(",", "")) if text else None
+        except ValueError:
+            return None
+    app_id = parse(app_id, int)
+    return (app_id, parse(price, float), parse(rating, float), parse(rating_count, int)) if app_id != None else None
+
+def record(connection : sqlite3.Connection, store_dir : str, observations : list[tuple], snapshot_time : float = None):
+    '''
+    Appends the changes in observations ((app_id, price, rating, rating count), see parse_observation)
+    to the history as one part of the snapshot at snapshot_time (now by default). Missing values are
+    not recorded, the last known value stays. Returns the number of games that changed.
+    '''
+    snapshot_time = snapshot_time or time.time()
+    observations = { observation[0] : observation for observation in observations } # The last observation of a game wins
+    app_ids = list(observations)
+    last = {}
+    for i in range(0, len(app_ids), 500): # SQLite limits the number of parameters
+        chunk = app_ids[i:i + 500]
+        for (app_id, *values) in connection.execute(f"SELECT * FROM last WHERE app_id IN ({','.join('?' * len(chunk))})", chunk):
+            last[app_id] = values
+    part_columns = { name : [] for name in schema.names }
+    changes = [] # (app_id, field)
+    new_last = []
+    for (app_id, *values) in observations.values():
+        old = last.get(app_id, [None, None, None])
+        changed = [value if value != None and value != old_value else None for (value, old_value) in zip(values, old)]
+        if all(value == None for value in changed):
+            continue
+        price, rating, rating_count = changed
+        part_columns["app_id"].append(app_id)
+        part_columns["price_cents"].append(round(price * 100) if price != None else None)
+        part_columns["rating"].append(rating)
+        part_columns["rating_count_delta"].append(rating_count - (old[2] or 0) if rating_count != None else None)
+        part_columns["first"].append(app_id not in last)
+        changes.extend((app_id, field) for (field, value) in zip(fields, changed) if value != None and field in indexed_fields)
+        new_last.append((app_id, *(value if value != None else old_value for (value, old_value) in zip(values, old))))
+    if len(new_last) == 0:
+        return 0
+    table = pa.Table.from_pydict(part_columns, schema=schema).sort_by("app_id") # Sorted, so the row group statistics narrow down app_id filters
+    snapshot_date = date.fromtimestamp(snapshot_time).isoformat()
+    part_id = (connection.execute("SELECT MAX(part_id) FROM parts").fetchone()[0] or 0) + 1
+    path = os.path.join(f"date={snapshot_date}", f"part-{part_id:06}.parquet")
+    os.makedirs(os.path.join(store_dir, f"date={snapshot_date}"), exist_ok=True)
+    pq.write_table(table, os.path.join(store_dir, path) + ".tmp", compression="zstd")
+    os.replace(os.path.join(store_dir, path) + ".tmp", os.path.join(store_dir, path)) # The part only counts once the manifest has it
+    connection.execute("INSERT INTO parts (part_id, time, date, path, rows) VALUES (?, ?, ?, ?, ?)", (part_id, snapshot_time, snapshot_date, path, table.num_rows))
+    connection.executemany("INSERT OR REPLACE INTO last VALUES (?, ?, ?, ?)", new_last)
+    connection.executemany("INSERT INTO changes VALUES (?, ?, ?)", [(app_id, field, part_id) for (app_id, field) in changes])
+    connection.commit()
+    return len(new_last)
+
+class HistorySink:
+    '''
+    Output sink (see OutputSinks.py) that records the price and ratings of every written row,
+    as one snapshot per run.
+    '''
+
+    def __init__(self, path : str, column_names : list[str], csv_path : str):
+        self.path = path
+        self.indices = [column_names.index(name) for name in ("App ID", "Price", "Rating", "Rating count")]
+        self.connection = None
+        self.buffer = []
+
+    def open(self, fresh : bool):
+        self.connection = connect(self.path) # Never cleared, the history outlives the csv file
+        self.snapshot_time = time.time()
+
+    def write(self, rows : list[list[str]]):
+        self.buffer.extend(observation for observation in (parse_observation(*(row[i] for i in self.indices)) for row in rows) if observation != None)
+        if len(self.buffer) >= flush_rows:
+            self.flush()
+
+    def flush(self):
+        record(self.connection, self.path, self.buffer, self.snapshot_time)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+        self.connection = None
+
+# ----------------------------------------
+
+def to_value(field : str, value):
+    '''
+    Turns a value of a part file back into the value of field (prices are stored in cents, ratings as float32).
+    '''
+    if value == None:
+        return None
+    if field == "price":
+        return value / 100
+    if field == "rating":
+        return round(value, 4)
+    return value
+
+def get_history(connection : sqlite3.Connection, store_dir : str, app_id : int, field : str = "price"):
+    '''
+    The values of field ("price", "rating" or "rating_count") of a game over time, [(datetime, value)],
+    one entry per change. Only reads the parts that changed the field of this game (for fields that
+    are not indexed, the row group statistics of every part are checked).
+    '''
+    if field in indexed_fields:
+        parts = connection.execute('''SELECT parts.time, parts.path FROM changes JOIN parts USING (part_id)
+                                      WHERE changes.app_id = ? AND changes.field = ? ORDER BY parts.part_id''', (app_id, field)).fetchall()
+    else:
+        parts = connection.execute("SELECT time, path FROM parts ORDER BY part_id").fetchall()
+    column = columns[field]
+    history = []
+    value = 0
+    for (part_time, path) in parts:
+        table = pq.read_table(os.path.join(store_dir, path), columns=[column], filters=[("app_id", "=", app_id)])
+        if table.num_rows == 0 or not table[column][0].is_valid:
+            continue
+        change = to_value(field, table[column][0].as_py())
+        value = value + change if field == "rating_count" else change
+        history.append((datetime.fromtimestamp(part_time), value))
+    return history
+
+def get_changes(connection : sqlite3.Connection, store_dir : str, start : str, end : str, field : str = "rating"):
+    '''
+    Games whose field changed between the dates start and end (inclusive, "YYYY-MM-DD"), not counting their first observation:
+    { app_id : [(datetime, new value or rating count delta)] }. Only reads the parts of these dates.
+    '''
+    column = columns[field]
+    changes = {}
+    for (part_time, path) in connection.execute("SELECT time, path FROM parts WHERE date BETWEEN ? AND ? ORDER BY part_id", (start, end)):
+        table = pq.read_table(os.path.join(store_dir, path), columns=["app_id", column, "first"])
+        table = table.filter(pc.and_(pc.is_valid(table[column]), pc.invert(table["first"])))
+        for (app_id, value) in zip(table["app_id"].to_pylist(), table[column].to_pylist()):
+            changes.setdefault(app_id, []).append((datetime.fromtimestamp(part_time), to_value(field, value)))
+    return changes
+
+def get_snapshot(connection : sqlite3.Connection):
+    '''
+    The last known price, rating and rating count of every game, { app_id : (price, rating, rating count) }.
+    '''
+    return { app_id : tuple(values) for (app_id, *values) in connection.execute("SELECT * FROM last") }
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 4 and sys.argv[2] in fields:
+        connection = connect(sys.argv[1])
+        for (change_time, value) in get_history(connection, sys.argv[1], int(sys.argv[3]), sys.argv[2]):
+            print(f"{change_time:%Y-%m-%d %H:%M}  {value}")
+    elif len(sys.argv) >= 5 and sys.argv[2] == "ratings":
+        connection = connect(sys.argv[1])
+        for (app_id, ratings) in sorted(get_changes(connection, sys.argv[1], sys.argv[3], sys.argv[4]).items()):
+            print(f"{app_id}: " + ", ".join(f"{change_time:%Y-%m-%d} {rating}" for (change_time, rating) in ratings))
+    else:
+        print("Usage: python History.py <store> price|rating|rating_count <app id> | python History.py <store> ratings <start date> <end date>")
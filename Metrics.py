@@ -0,0 +1,232 @@
+from functools import wraps
+import threading
+import bisect
+import json
+import time
+import os
+
+''' Settings '''
+enabled = True # Whether the stages are timed. Costs about 1.5 microseconds per timed call.
+metrics_path = None # File that the metrics are dumped to every dump_interval seconds and at the end of a run: "*.json" or Prometheus text (anything else, e.g. "metrics.prom"). None for no dump.
+dump_interval = 10 # Seconds between two dumps
+profiler = None # Profiles every run (only the main thread, so best with multithreaded = False): "cprofile" (written to profile_path, view with python -m pstats or snakeviz) or "pyinstrument" (HTML next to profile_path). None for no profiling.
+profile_path = "SteamScraper.prof"
+
+'''
+Instrumentation for SteamScraper: Timers with histograms for every stage (get_games, get_more_data,
+the extractors, write_data_to_csv_file, ...), counters (bytes, response status codes) and gauges
+(queue depths, the concurrency limit of RequestScheduler.py), which are sampled when they are read.
+Stages are timed with the timed decorator or the timer context manager. The metrics can be dumped
+periodically as JSON or in the Prometheus text format (e.g. for node_exporter's textfile collector),
+and every run can optionally be profiled with cProfile or pyinstrument.
+Metrics of parse processes (setting multiprocess) are not collected, only those of the main process.
+'''
+
+buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # Upper bounds in seconds, the last bucket is unbounded
+
+lock = threading.Lock()
+histograms = {} # stage -> [count of every bucket, sum, count]
+counters = {} # (name, labels) -> value
+gauges = {} # (name, labels) -> function that returns the current value
+run_started = None
+dumper = None
+dumper_stop = threading.Event()
+active_profiler = None
+
+def get_labels(labels : dict):
+    return tuple(sorted(labels.items()))
+
+def observe(stage : str, seconds : float):
+    with lock:
+        histogram = histograms.get(stage)
+        if histogram == None:
+            histogram = histograms[stage] = [[0] * (len(buckets) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(buckets, seconds)] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+class timer:
+    '''
+    Context manager that times a stage: with Metrics.timer("get_games"): ...
+    '''
+    def __init__(self, stage : str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+
+    def __exit__(self, *exception):
+        if enabled:
+            observe(self.stage, time.perf_counter() - self.start_time)
+
+def timed(function):
+    '''
+    Decorator that times every call of function as the stage of the same name.
+    '''
+    stage = function.__name__
+    @wraps(function)
+    def timed_function(*args, **kwargs):
+        if not enabled:
+            return function(*args, **kwargs)
+        start_time = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            observe(stage, time.perf_counter() - start_time)
+    return timed_function
+
+def count(name : str, value : float = 1, **labels):
+    key = (name, get_labels(labels))
+    with lock:
+        counters[key] = counters.get(key, 0) + value
+
+def register_gauge(name : str, function, **labels):
+    '''
+    Registers a function that is called for the current value of a gauge whenever the metrics are read.
+    '''
+    with lock:
+        gauges[(name, get_labels(labels))] = function
+
+def remove_gauges(name : str):
+    with lock:
+        for key in [key for key in gauges if key[0] == name]:
+            del gauges[key]
+
+def reset():
+    with lock:
+        histograms.clear()
+        counters.clear()
+
+# ----------------------------------------
+
+def get_quantile(histogram : list, quantile : float):
+    '''
+    Estimates a quantile of a histogram by interpolating linearly within its bucket.
+    '''
+    bucket_counts, _, total = histogram
+    if total == 0:
+        return None
+    rank = quantile * total
+    seen = 0
+    for (i, bucket_count) in enumerate(bucket_counts):
+        if bucket_count > 0 and seen + bucket_count >= rank:
+            lower = buckets[i - 1] if i > 0 else 0.0
+            upper = buckets[i] if i < len(buckets) else buckets[-1] * 2
+            return lower + (upper - lower) * (rank - seen) / bucket_count
+        seen += bucket_count
+    return buckets[-1]
+
+def snapshot():
+    '''
+    Returns all metrics as a dict that can be serialized to JSON.
+    '''
+    with lock:
+        stages = { stage : { "count" : histogram[2], "sum" : histogram[1], "p50" : get_quantile(histogram, 0.5), "p99" : get_quantile(histogram, 0.99),
+                             "buckets" : dict(zip([str(bound) for bound in buckets] + ["+Inf"], histogram[0])) }
+                   for (stage, histogram) in histograms.items() }
+        counter_values = [{ "name" : name, "labels" : dict(labels), "value" : value } for ((name, labels), value) in counters.items()]
+        gauge_functions = list(gauges.items())
+    gauge_values = []
+    for ((name, labels), function) in gauge_functions: # Outside the lock, the functions may take locks of their own
+        try:
+            gauge_values.append({ "name" : name, "labels" : dict(labels), "value" : function() })
+        except Exception:
+            pass
+    return { "time" : time.time(), "run_seconds" : time.time() - run_started if run_started != None else 0.0,
+             "stages" : stages, "counters" : counter_values, "gauges" : gauge_values }
+
+def format_labels(labels : dict):
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for (name, value) in labels.items()) + "}"
+
+def to_prometheus(metrics : dict):
+    '''
+    Formats a snapshot in the Prometheus text exposition format.
+    '''
+    lines = ["# TYPE steamscraper_stage_seconds histogram"]
+    for (stage, values) in metrics["stages"].items():
+        cumulative = 0
+        for (bound, bucket_count) in values["buckets"].items():
+            cumulative += bucket_count
+            lines.append(f'steamscraper_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'steamscraper_stage_seconds_sum{{stage="{stage}"}} {values["sum"]}')
+        lines.append(f'steamscraper_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+    for (metric_type, values) in (("counter", metrics["counters"]), ("gauge", metrics["gauges"])):
+        for name in sorted(set(value["name"] for value in values)):
+            lines.append(f"# TYPE steamscraper_{name} {metric_type}")
+            lines.extend(f'steamscraper_{name}{format_labels(value["labels"])} {value["value"]}' for value in values if value["name"] == name)
+    return "\n".join(lines) + "\n"
+
+def dump(path : str = None):
+    '''
+    Writes a snapshot to path (metrics_path by default), as JSON if it ends with .json, otherwise as Prometheus text.
+    '''
+    path = path or metrics_path
+    metrics = snapshot()
+    with open(path + ".tmp", "w", encoding="utf-8") as metrics_file:
+        if path.endswith(".json"):
+            json.dump(metrics, metrics_file, indent=1)
+        else:
+            metrics_file.write(to_prometheus(metrics))
+    os.replace(path + ".tmp", path) # Readers (e.g. a textfile collector) never see a half-written file
+
+def summary():
+    '''
+    A table of the stages: calls, total seconds, mean, p50 and p99 in milliseconds.
+    '''
+    metrics = snapshot()
+    lines = [f"{'Stage':<26} {'Calls':>8} {'Total s':>9} {'Mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}"]
+    for (stage, values) in sorted(metrics["stages"].items(), key=lambda item: -item[1]["sum"]):
+        lines.append(f"{stage:<26} {values['count']:>8} {values['sum']:>9.2f} {1000 * values['sum'] / values['count']:>9.3f} "
+                     f"{1000 * values['p50']:>9.3f} {1000 * values['p99']:>9.3f}")
+    for value in metrics["counters"]:
+        lines.append(f"{value['name']}{format_labels(value['labels'])} {value['value']}")
+    return "\n".join(lines)
+
+# ----------------------------------------
+
+def start_run():
+    '''
+    Resets the metrics and starts the periodic dump and the profiler (if configured). Called by SteamScraper.main.
+    '''
+    global run_started, dumper, active_profiler
+    reset()
+    run_started = time.time()
+    if metrics_path != None:
+        dumper_stop.clear()
+        dumper = threading.Thread(target=dump_periodically, daemon=True)
+        dumper.start()
+    if profiler == "cprofile":
+        import cProfile
+        active_profiler = cProfile.Profile()
+        active_profiler.enable()
+    elif profiler == "pyinstrument":
+        import pyinstrument # Optional dependency, only needed for this profiler
+        active_profiler = pyinstrument.Profiler()
+        active_profiler.start()
+
+def finish_run():
+    '''
+    Stops the profiler and writes its results, stops the periodic dump and dumps the final metrics.
+    '''
+    global dumper, active_profiler
+    if active_profiler != None:
+        if profiler == "cprofile":
+            active_profiler.disable()
+            active_profiler.dump_stats(profile_path)
+        else:
+            active_profiler.stop()
+            with open(os.path.splitext(profile_path)[0] + ".html", "w", encoding="utf-8") as profile_file:
+                profile_file.write(active_profiler.output_html())
+        active_profiler = None
+    if dumper != None:
+        dumper_stop.set()
+        dumper.join()
+        dumper = None
+    if metrics_path != None:
+        dump()
+
+def dump_periodically():
+    while not dumper_stop.wait(dump_interval):
+        dump()
@@ -0,0 +1,174 @@
+from functools import lru_cache
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import csv
+import sys
+import os
+
+import Aggregates
+import History
+
+'''
+Additional outputs of SteamScraper, written next to the csv file.
+Every sink gets the same rows as the csv file (lists of strings in the order of SteamScraper.column_names)
+once per batch. To add an output, write a class with open(fresh), write(rows) and close() and register it
+in sink_types.
+'''
+
+column_types = {
+    "Price" : "float",
+    "Release date" : "date",
+    "Genre 1" : "category",
+    "Genre 2" : "category",
+    "Rating" : "float",
+    "Rating count" : "int",
+    **{ f"{reqs} {column}" : column_type for reqs in ("Min", "Rec") for (column, column_type) in (
+        ("OS Version", "category"), ("Processor Intel", "category"), ("Processor AMD", "category"),
+        ("Graphics NVIDIA", "category"), ("Graphics AMD", "category"), ("Memory MB", "int"), ("Storage MB", "int")) },
+} # Every other column is a plain string
+arrow_types = { "float" : pa.float64(), "int" : pa.int64(), "date" : pa.date32(), "category" : pa.dictionary(pa.int32(), pa.string()), "string" : pa.string() }
+release_date_formats = ["%d %b, %Y", "%b %d, %Y", "%d %B, %Y", "%B %d, %Y", "%b %Y", "%B %Y", "%Y"] # Steam writes dates differently depending on the locale and how exact they are
+
+sinks = []
+
+def open_sinks(output_sinks : dict, column_names : list[str], csv_path : str, fresh : bool):
+    '''
+    Creates and opens a sink for every entry ({ type : path }) of output_sinks.
+    fresh tells the sinks whether the csv file has just been created or is continued.
+    '''
+    global sinks
+    sinks = [sink_types[sink_type](path, column_names, csv_path) for (sink_type, path) in output_sinks.items()]
+    for sink in sinks:
+        sink.open(fresh)
+
+def write(rows : list[list[str]]):
+    for sink in sinks:
+        sink.write(rows)
+
+def close_sinks():
+    global sinks
+    for sink in sinks:
+        sink.close()
+    sinks = []
+
+# ----------------------------------------
+
+@lru_cache(maxsize=16384)
+def parse_date(text : str):
+    for date_format in release_date_formats:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    return None # "Coming soon", "To be announced", ...
+
+def parse_number(text : str, number_type : type):
+    try:
+        return number_type(text.replace(",", "")) if text else None
+    except ValueError:
+        return None
+
+def to_array(values : list, column_type : str):
+    '''
+    Converts the csv strings of one column to a typed arrow array. Empty strings become nulls.
+    '''
+    if column_type == "float":
+        return pa.array([parse_number(v, float) for v in values], type=pa.float64())
+    if column_type == "int":
+        return pa.array([parse_number(v, int) for v in values], type=pa.int64())
+    if column_type == "date":
+        return pa.array([parse_date(v) if v else None for v in values], type=pa.date32())
+    values = [str(v) if v not in (None, "") else None for v in values]
+    if column_type == "category":
+        return pa.array(values, type=pa.string()).dictionary_encode()
+    return pa.array(values, type=pa.string())
+
+def get_schema(column_names : list[str]):
+    return pa.schema([(name, arrow_types[column_types.get(name, "string")]) for name in column_names])
+
+def to_table(rows : list[list[str]], column_names : list[str]):
+    columns = list(zip(*rows)) if len(rows) > 0 else [[] for _ in column_names]
+    arrays = [to_array(list(values), column_types.get(name, "string")) for (name, values) in zip(column_names, columns)]
+    return pa.Table.from_arrays(arrays, schema=get_schema(column_names))
+
+# ----------------------------------------
+
+class ParquetSink:
+    '''
+    Writes the rows with typed columns to a Parquet file. Batches are buffered until they fill a
+    row group, since many tiny row groups make reading slow.
+    During a run the row groups go to "<path>.partial". When the run is closed, they are merged
+    with the rows of earlier runs (newer rows replace older rows of the same app ID).
+    If a run was interrupted, the partial file is unusable and the Parquet file is rebuilt from
+    the csv file instead.
+    '''
+
+    row_group_size = 20000
+
+    def __init__(self, path : str, column_names : list[str], csv_path : str):
+        self.path = path
+        self.partial_path = path + ".partial"
+        self.column_names = column_names
+        self.csv_path = csv_path
+        self.writer = None
+        self.buffer = []
+        self.rebuild = False
+
+    def open(self, fresh : bool):
+        if fresh and os.path.exists(self.path):
+            os.remove(self.path)
+        self.rebuild = not fresh and (os.path.exists(self.partial_path) or not os.path.exists(self.path))
+        self.writer = pq.ParquetWriter(self.partial_path, get_schema(self.column_names), compression="zstd")
+
+    def write(self, rows : list[list[str]]):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) > 0:
+            self.writer.write_table(to_table(self.buffer, self.column_names))
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if self.rebuild:
+            csv_to_parquet(self.csv_path, self.path)
+            os.remove(self.partial_path)
+            return
+        if not os.path.exists(self.path):
+            os.replace(self.partial_path, self.path)
+            return
+        new_rows = pq.read_table(self.partial_path)
+        old_rows = pq.read_table(self.path)
+        old_rows = old_rows.filter(pc.invert(pc.is_in(old_rows["App ID"], value_set=new_rows["App ID"])))
+        pq.write_table(pa.concat_tables([old_rows, new_rows]), self.path + ".tmp", compression="zstd")
+        os.replace(self.path + ".tmp", self.path)
+        os.remove(self.partial_path)
+
+sink_types = { "parquet" : ParquetSink, "aggregates" : Aggregates.AggregateSink, "history" : History.HistorySink }
+
+def csv_to_parquet(csv_path : str, parquet_path : str, row_group_size : int = 50000):
+    '''
+    Converts a csv file written by SteamScraper to a typed Parquet file, streaming it in row groups.
+    Also useful for converting existing datasets: python OutputSinks.py SteamData.csv SteamData.parquet
+    '''
+    with open(csv_path, "r", encoding="utf-16", newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        column_names = next(reader)
+        with pq.ParquetWriter(parquet_path + ".tmp", get_schema(column_names), compression="zstd") as writer:
+            rows = []
+            for row in reader:
+                rows.append(row)
+                if len(rows) == row_group_size:
+                    writer.write_table(to_table(rows, column_names))
+                    rows = []
+            if len(rows) > 0:
+                writer.write_table(to_table(rows, column_names))
+    os.replace(parquet_path + ".tmp", parquet_path)
+
+if __name__ == '__main__':
+    csv_to_parquet(sys.argv[1], sys.argv[2])
@@ -0,0 +1,130 @@
+from lxml import etree
+import lxml.html
+
+import Metrics
+
+'''
+Single-pass extractor for Steam game pages.
+Parses a page once with lxml and gets every field with precompiled XPath expressions,
+instead of building a BeautifulSoup tree and searching it five times (get_price, get_release_date, ...).
+Produces exactly the same game_info entries as the BeautifulSoup functions in SteamScraper.py,
+including their quirks, which is checked against the pages in GoldenPages/ (see Benchmark.py).
+'''
+
+parser = lxml.html.HTMLParser(encoding="utf-8") # Steam pages are always UTF-8
+
+def has_class(name : str):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+xpath_price = etree.XPath("//div[@class='game_purchase_price price']")
+xpath_original_price = etree.XPath(f"//div[{has_class('discount_original_price')}]")
+xpath_release_date = etree.XPath(f"//*[{has_class('release_date')}]//*[{has_class('date')}]")
+xpath_sys_req = etree.XPath("//div[@class='game_area_sys_req sysreq_content active' and @data-os='win']")
+xpath_sys_req_min = etree.XPath(f".//*[{has_class('game_area_sys_req_leftCol')}]")
+xpath_sys_req_rec = etree.XPath(f".//*[{has_class('game_area_sys_req_rightCol')}]")
+xpath_items = etree.XPath(".//li")
+xpath_rating = etree.XPath("//meta[@itemprop='ratingValue']")
+xpath_rating_count = etree.XPath("//meta[@itemprop='reviewCount']")
+xpath_genres_span = etree.XPath("//div[@id='genresAndManufacturer']//span")
+xpath_first_genre = etree.XPath("(descendant::a | following::a)[1]")
+xpath_second_genre = etree.XPath("following-sibling::a[1]")
+
+def extract(game_info : dict, content : bytes):
+    '''
+    Parses a downloaded Steam page of a game.
+    Writes directly to game_info.
+    '''
+    root = lxml.html.fromstring(content, parser=parser)
+
+    extract_price(game_info, root)
+    extract_release_date(game_info, root)
+    extract_sys_reqs(game_info, root)
+    extract_ratings(game_info, root)
+    extract_genre(game_info, root)
+
+# ----------------------------------------
+
+def get_string(element):
+    '''
+    Equivalent of BeautifulSoup's Tag.string: The text of element if it has exactly one child
+    (recursively), otherwise None.
+    '''
+    nodes = []
+    if element.text:
+        nodes.append(element.text)
+    for child in element:
+        nodes.append(child)
+        if child.tail:
+            nodes.append(child.tail)
+    if len(nodes) != 1:
+        return None
+    if isinstance(nodes[0], str):
+        return str(nodes[0])
+    return get_string(nodes[0])
+
+def first(elements : list):
+    return elements[0] if len(elements) > 0 else None
+
+@Metrics.timed
+def extract_price(game_info : dict, root):
+    price_div = first(xpath_price(root))
+    if price_div == None:
+        price_div = first(xpath_original_price(root))
+        if price_div == None:
+            return
+    price = price_div.text_content().strip() # strip is important
+    if price.lower() == "free to play":
+        game_info["price"] = "0"
+        return
+    price = price.replace(price[-1], "")
+    price = price.replace(",", ".")
+    if not all(map(lambda s: s.isnumeric(), price.split("."))):
+        price = ""
+    game_info["price"] = price
+
+@Metrics.timed
+def extract_release_date(game_info : dict, root):
+    release_date_div = first(xpath_release_date(root))
+    if release_date_div != None:
+        game_info["release_date"] = get_string(release_date_div)
+
+@Metrics.timed
+def extract_sys_reqs(game_info : dict, root):
+    game_info["sys_reqs_min"] = {"OS" : "", "Processor" : "", "Graphics" : "", "Memory" : "", "Storage" : ""}
+    game_info["sys_reqs_rec"] = {"OS" : "", "Processor" : "", "Graphics" : "", "Memory" : "", "Storage" : ""}
+    sys_req_div = first(xpath_sys_req(root))
+    if sys_req_div == None:
+        return
+    for (xpath_col, key) in ((xpath_sys_req_min, "sys_reqs_min"), (xpath_sys_req_rec, "sys_reqs_rec")):
+        col = first(xpath_col(sys_req_div))
+        if col != None:
+            extract_sys_req_items(game_info[key], col)
+
+def extract_sys_req_items(reqs : dict, col):
+    '''
+    Writes the "Name: Value" list items below col (e.g. "OS: Windows 10") to reqs.
+    '''
+    for item in xpath_items(col):
+        reqStrs = item.text_content().split(":")
+        if (len(reqStrs) == 2):
+            reqs[reqStrs[0].strip()] = reqStrs[1].strip()
+
+@Metrics.timed
+def extract_ratings(game_info : dict, root):
+    ratings_meta = first(xpath_rating(root))
+    if ratings_meta != None:
+        game_info["rating"] = ratings_meta.attrib["content"]
+    ratings_count_meta = first(xpath_rating_count(root))
+    if ratings_count_meta != None:
+        game_info["ratingCount"] = ratings_count_meta.attrib["content"]
+
+@Metrics.timed
+def extract_genre(game_info : dict, root):
+    genres_span = first(xpath_genres_span(root))
+    if genres_span != None:
+        first_genre_link = first(xpath_first_genre(genres_span))
+        if first_genre_link != None:
+            game_info["genre0"] = get_string(first_genre_link)
+            second_genre_link = first(xpath_second_genre(first_genre_link))
+            if second_genre_link != None:
+                game_info["genre1"] = get_string(second_genre_link)
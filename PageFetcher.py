@@ -0,0 +1,219 @@
+import requests
+from requests.adapters import HTTPAdapter
+import threading
+import hashlib
+import json
+import time
+import os
+
+import RequestScheduler
+import Metrics
+
+''' Settings '''
+pool_size = 32 # How many keep-alive connections the shared session holds per host. Should be >= max_workers.
+use_cache = True # Whether to keep an on-disk cache of responses and revalidate it with conditional requests
+cache_dir = "SteamCache" # (Relative) Path to the directory of the response cache
+cache_max_bytes = 2 * 1024**3 # Evict the oldest cache entries when the cache grows beyond this size
+cache_max_age = 30 * 24 * 3600 # Evict cache entries that have not been stored / revalidated for this many seconds
+
+'''
+Shared HTTP layer for SteamScraper.
+All requests go through one pooled requests.Session, so connections (and TLS sessions) are reused,
+and through RequestScheduler.py, which limits their rate / concurrency and retries failed requests.
+Responses with an ETag or Last-Modified header are stored in cache_dir, keyed by URL. The next
+request for the same URL is sent as a conditional request and a 304 is answered from the cache.
+'''
+
+session = None
+session_lock = threading.Lock()
+stats = { "requests" : 0, "cache_hits" : 0, "bytes_downloaded" : 0, "bytes_saved" : 0, "retries" : 0 }
+stats_lock = threading.Lock()
+response_hooks = [] # Functions that are called with (url, body) for every response, e.g. for recording them (see Replay.py)
+
+def get_session():
+    global session
+    with session_lock:
+        if session == None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        return session
+
+def fetch(url : str):
+    '''
+    Gets url through the shared session (and the cache, if enabled).
+    Returns the body of the response. Raises requests.HTTPError for other status codes than 200 / 304
+    (after retrying 429 / 5xx) and requests.RequestException if all retries failed.
+    '''
+    attempt = 0
+    while True:
+        RequestScheduler.acquire()
+        start_time = time.monotonic()
+        response, error = None, None
+        request_headers = conditional_headers(url)
+        try:
+            response = get_session().get(url, headers=request_headers, timeout=RequestScheduler.timeout)
+        except requests.RequestException as e:
+            error = e
+        retry_after = RequestScheduler.get_retry_after(response.headers) if response != None else None
+        RequestScheduler.release(response.status_code if response != None else None, time.monotonic() - start_time, retry_after)
+        record_response(response.status_code if response != None else None, time.monotonic() - start_time)
+        if response != None and response.status_code in (200, 304):
+            content = handle_response(url, response.status_code, response.headers, response.content)
+            if content != None:
+                return content
+            if len(request_headers) == 0:
+                raise requests.HTTPError(f"304 for {url} without a conditional request", response=response)
+            continue # The cached body is gone, repeat the request without the conditional headers
+        if response != None and not RequestScheduler.is_retryable(response.status_code):
+            raise requests.HTTPError(f"{response.status_code} for {url}", response=response)
+        if attempt >= RequestScheduler.max_retries:
+            if error != None:
+                raise error
+            raise requests.HTTPError(f"{response.status_code} for {url} after {attempt} retries", response=response)
+        with stats_lock:
+            stats["retries"] += 1
+        time.sleep(RequestScheduler.backoff_delay(attempt, retry_after))
+        attempt += 1
+
+def record_response(status : int, latency : float):
+    '''
+    Records the latency and the status code (None for timeouts / connection errors) of a request in Metrics.py.
+    '''
+    Metrics.observe("request", latency)
+    Metrics.count("responses_total", status=status if status != None else "error")
+
+# ----------------------------------------
+
+def cache_paths(url : str):
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, key + ".body"), os.path.join(cache_dir, key + ".json")
+
+def conditional_headers(url : str):
+    '''
+    Returns the If-None-Match / If-Modified-Since headers for url if it is in the cache.
+    '''
+    if not use_cache:
+        return {}
+    meta = read_meta(url)
+    if meta == None:
+        return {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+def handle_response(url : str, status : int, headers, content : bytes):
+    '''
+    Serves a 304 from the cache or stores a fresh response in it. Updates stats and calls response_hooks.
+    Returns the body that belongs to url, or None if the cached body of a 304 is gone. Then the cache entry
+    is removed and the request has to be repeated without the conditional headers.
+    '''
+    content = resolve_response(url, status, headers, content)
+    if content == None:
+        return None
+    for hook in response_hooks:
+        hook(url, content)
+    return content
+
+def resolve_response(url : str, status : int, headers, content : bytes):
+    with stats_lock:
+        stats["requests"] += 1
+        stats["bytes_downloaded"] += len(content)
+    Metrics.count("bytes_downloaded_total", len(content))
+    if not use_cache:
+        return content
+    body_path, meta_path = cache_paths(url)
+    if status == 304:
+        try:
+            with open(body_path, "rb") as body_file:
+                content = body_file.read()
+        except FileNotFoundError: # Evicted in the meantime, so the 304 cannot be served
+            try:
+                os.remove(meta_path)
+            except FileNotFoundError:
+                pass
+            return None
+        os.utime(meta_path) # Revalidated, so it counts as fresh again for eviction
+        with stats_lock:
+            stats["cache_hits"] += 1
+            stats["bytes_saved"] += len(content)
+        Metrics.count("cache_hits_total")
+        return content
+    etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+    if status == 200 and (etag or last_modified):
+        write_entry(url, content, { "url" : url, "etag" : etag, "last_modified" : last_modified })
+    return content
+
+def read_meta(url : str):
+    body_path, meta_path = cache_paths(url)
+    if not os.path.exists(body_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as meta_file:
+            return json.load(meta_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def write_entry(url : str, content : bytes, meta : dict):
+    '''
+    Writes body and metadata of url to the cache. Uses temporary files + os.replace, since
+    several threads may store the same URL at the same time.
+    '''
+    os.makedirs(cache_dir, exist_ok=True)
+    body_path, meta_path = cache_paths(url)
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(body_path + suffix, "wb") as body_file:
+        body_file.write(content)
+    os.replace(body_path + suffix, body_path)
+    with open(meta_path + suffix, "w", encoding="utf-8") as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(meta_path + suffix, meta_path)
+
+def evict_cache():
+    '''
+    Removes cache entries older than cache_max_age, then the oldest entries
+    until the cache is smaller than cache_max_bytes.
+    '''
+    if not os.path.isdir(cache_dir):
+        return
+    entries = [] # (last stored / revalidated, size, key)
+    for file_name in os.listdir(cache_dir):
+        if not file_name.endswith(".json"):
+            continue
+        key = file_name[:-len(".json")]
+        try:
+            stored = os.path.getmtime(os.path.join(cache_dir, file_name))
+            size = os.path.getsize(os.path.join(cache_dir, key + ".body"))
+        except FileNotFoundError:
+            continue
+        entries.append((stored, size, key))
+    entries.sort()
+    total_size = sum(size for (_, size, _) in entries)
+    now = time.time()
+    for (stored, size, key) in entries:
+        if now - stored <= cache_max_age and total_size <= cache_max_bytes:
+            break
+        for extension in (".body", ".json"):
+            try:
+                os.remove(os.path.join(cache_dir, key + extension))
+            except FileNotFoundError:
+                pass
+        total_size -= size
+
+# ----------------------------------------
+
+def cache_hit_ratio():
+    return stats["cache_hits"] / stats["requests"] if stats["requests"] > 0 else 0.0
+
+def reset_stats():
+    with stats_lock:
+        for key in stats:
+            stats[key] = 0
+
+def stats_summary():
+    return (f"{stats['requests']} requests, {stats['retries']} retries, {cache_hit_ratio():.1%} cache hits, "
+            f"{stats['bytes_downloaded'] / 1024**2:.1f} MB downloaded, {stats['bytes_saved'] / 1024**2:.1f} MB served from cache")
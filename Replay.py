@@ -0,0 +1,256 @@
+from urllib.parse import urlsplit
+import multiprocessing
+import threading
+import tempfile
+import resource
+import zipfile
+import json
+import time
+import sys
+import os
+
+import SteamScraper
+import PageFetcher
+import RequestScheduler
+import Checkpoint
+import StubServer
+import Metrics
+
+''' Settings '''
+replay_latency = 0.05 # Seconds every replayed response is delayed by
+replay_error_rate = 0.0 # Share of replayed requests that fail with a 5xx (they are retried)
+replay_modes = { # Engines that the replay benchmark runs, with their settings
+    "single-threaded" : { "multithreaded" : False },
+    "threaded" : { "multithreaded" : True },
+    "multiprocess" : { "multiprocess" : True },
+    "asyncio" : { "asynchronous" : True },
+    "streaming" : { "streaming" : True },
+}
+
+'''
+Offline record / replay of Steam responses, so performance changes can be measured without Steam
+(and without its noise).
+Recording hooks into PageFetcher.response_hooks and stores every search page, game page and API response
+of a scrape in an LZMA-compressed zip archive. Replaying serves the archive with StubServer.py in a
+separate process (with latency and error injection), and runs the full SteamScraper.main against it in
+every engine, reporting rows/s, p50 / p99 request latency, CPU time and peak RSS.
+
+    python Replay.py record SteamFixtures.zip 20   Scrapes 20 batches from store_url and records them
+    python Replay.py benchmark SteamFixtures.zip   Replays the archive through every engine
+'''
+
+index_name = "index.json"
+
+class Recorder:
+    '''
+    Writes every response that goes through PageFetcher to a fixture archive.
+    '''
+
+    def __init__(self, archive_path : str, store_url : str):
+        self.archive = zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_LZMA)
+        self.store_url = store_url
+        self.entries = {} # path with query -> { "file" : name in the archive, "content_type" : ... }
+        self.lock = threading.Lock()
+
+    def record(self, url : str, content : bytes):
+        path = get_path(url)
+        with self.lock:
+            if path in self.entries:
+                return
+            file_name = f"{len(self.entries):07}"
+            self.archive.writestr(file_name, content)
+            self.entries[path] = { "file" : file_name, "content_type" : get_content_type(path) }
+
+    def close(self):
+        with self.lock:
+            self.archive.writestr(index_name, json.dumps({ "store_url" : self.store_url, "recorded" : time.time(), "entries" : self.entries }))
+            self.archive.close()
+
+def get_path(url : str):
+    url = urlsplit(url)
+    return url.path + ("?" + url.query if url.query else "")
+
+def get_content_type(path : str):
+    if path.startswith("/search/results") or path.startswith("/api/"):
+        return "application/json"
+    return "text/html; charset=utf-8"
+
+def record(archive_path : str, batches : int = None):
+    '''
+    Runs SteamScraper.main (with its current settings, but a temporary csv file and no response cache)
+    and records every response into archive_path.
+    '''
+    recorder = Recorder(archive_path, SteamScraper.store_url)
+    PageFetcher.response_hooks.append(recorder.record)
+    csv_path, saved_batches, use_cache, resume = SteamScraper.csv_path, SteamScraper.batches, PageFetcher.use_cache, Checkpoint.resume
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            SteamScraper.csv_path = os.path.join(directory, "Recording.csv")
+            SteamScraper.batches = batches or SteamScraper.batches
+            PageFetcher.use_cache = False # Every response has to come from the store
+            Checkpoint.resume = False
+            SteamScraper.main()
+    finally:
+        PageFetcher.response_hooks.remove(recorder.record)
+        SteamScraper.csv_path, SteamScraper.batches, PageFetcher.use_cache, Checkpoint.resume = csv_path, saved_batches, use_cache, resume
+        recorder.close()
+    return len(recorder.entries)
+
+def load_fixtures(archive_path : str, base_url : str):
+    '''
+    Reads an archive into the { path : (content type, body) } that StubServer.fixtures expects.
+    Links to the recorded store in search results point to base_url instead.
+    '''
+    fixtures = {}
+    with zipfile.ZipFile(archive_path, "r") as archive:
+        index = json.loads(archive.read(index_name))
+        store_url = index["store_url"].encode("utf-8")
+        escaped_store_url = store_url.replace(b"/", b"\\/") # How the links look inside JSON strings
+        for (path, entry) in index["entries"].items():
+            body = archive.read(entry["file"])
+            if path.startswith("/search/results"):
+                body = body.replace(store_url, base_url.encode("utf-8")).replace(escaped_store_url, base_url.encode("utf-8").replace(b"/", b"\\/"))
+            fixtures[path] = (entry["content_type"], body)
+    return fixtures, index
+
+def count_batches(index : dict):
+    return sum(1 for path in index["entries"] if path.startswith("/search/results"))
+
+# ----------------------------------------
+
+def serve(archive_path : str, latency : float, error_rate : float, connection):
+    '''
+    Runs in the server process: Serves the archive and sends the base URL through connection.
+    '''
+    StubServer.latency, StubServer.error_rate = latency, error_rate
+    server, base_url = StubServer.start()
+    StubServer.fixtures = load_fixtures(archive_path, base_url)[0]
+    connection.send(base_url)
+    connection.recv() # Until the benchmark is done
+    server.shutdown()
+
+def start_server(archive_path : str):
+    '''
+    Starts the replay server in its own process, so that its CPU time is not counted for the scraper.
+    Returns the process, a connection to stop it (send anything) and the base URL.
+    '''
+    connection, server_connection = multiprocessing.Pipe()
+    process = multiprocessing.get_context("spawn").Process(target=serve, args=(archive_path, replay_latency, replay_error_rate, server_connection), daemon=True)
+    process.start()
+    server_connection.close() # Only the server holds its end now, so recv() fails instead of blocking if the server dies
+    try:
+        return process, connection, connection.recv()
+    except EOFError:
+        process.join()
+        raise RuntimeError(f"Replay server did not start (exit code {process.exitcode})")
+
+class PeakRSS:
+    '''
+    Samples the resident set size of this process (and of its children, e.g. parse processes) while it runs.
+    '''
+
+    def __init__(self, interval : float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exception):
+        self.stopped.set()
+        self.thread.join()
+
+    def sample(self):
+        while True:
+            self.peak = max(self.peak, get_rss(os.getpid()) + sum(get_rss(pid) for pid in get_children()))
+            if self.stopped.wait(self.interval):
+                return
+
+def get_rss(pid : int):
+    try:
+        with open(f"/proc/{pid}/statm", "r") as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def get_children():
+    try:
+        with open(f"/proc/{os.getpid()}/task/{os.getpid()}/children", "r") as children_file:
+            return [int(pid) for pid in children_file.read().split()]
+    except OSError:
+        return []
+
+def get_cpu_time():
+    '''
+    User + system CPU seconds of this process and of its finished children.
+    '''
+    usages = [resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)]
+    return sum(usage.ru_utime + usage.ru_stime for usage in usages)
+
+def run_mode(base_url : str, csv_path : str, batches : int, settings : dict, connection):
+    '''
+    Runs in a fresh process per engine, so CPU time and peak RSS are not mixed up with the other runs:
+    Runs SteamScraper.main against the replay server and sends rows, wall seconds, CPU seconds,
+    peak RSS in bytes and the request histogram of Metrics.py through connection.
+    '''
+    engine_settings = { "multithreaded" : False, "multiprocess" : False, "asynchronous" : False, "streaming" : False, **settings }
+    for (key, value) in engine_settings.items():
+        setattr(SteamScraper, key, value)
+    SteamScraper.store_url, SteamScraper.csv_path, SteamScraper.batches, SteamScraper.verbose = base_url, csv_path, batches, False
+    PageFetcher.use_cache = False
+    Checkpoint.resume = False
+    RequestScheduler.max_requests_per_second = 10000 # The engines are measured, not the rate limit
+    RequestScheduler.reset()
+    cpu_time = get_cpu_time()
+    with PeakRSS() as peak_rss:
+        start_time = time.perf_counter()
+        SteamScraper.main()
+        elapsed = time.perf_counter() - start_time
+    cpu_time = get_cpu_time() - cpu_time
+    with open(csv_path, "r", encoding="utf-16") as csv_file:
+        rows = sum(1 for _ in csv_file) - 1
+    connection.send((rows, elapsed, cpu_time, peak_rss.peak, Metrics.snapshot()["stages"].get("request", {})))
+
+def benchmark(archive_path : str, modes : dict = None):
+    '''
+    Replays archive_path through every engine in modes (replay_modes by default) and prints
+    rows/s, p50 / p99 request latency, CPU time and peak RSS.
+    '''
+    server_process, server_connection, base_url = start_server(archive_path)
+    with zipfile.ZipFile(archive_path, "r") as archive:
+        index = json.loads(archive.read(index_name))
+    batches = count_batches(index)
+    print(f"\nReplay: {len(index['entries'])} responses ({batches} batches), {replay_latency}s latency, {replay_error_rate:.0%} errors\n")
+    print(f"{'Mode':<16} {'Rows':>6} {'Rows/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'CPU s':>7} {'Peak RSS':>9}")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for (name, settings) in (modes or replay_modes).items():
+                connection, mode_connection = multiprocessing.Pipe()
+                process = multiprocessing.get_context("spawn").Process(target=run_mode, args=(base_url, os.path.join(directory, f"{name}.csv"), batches, settings, mode_connection))
+                process.start()
+                mode_connection.close() # Only the child holds its end now, so recv() fails instead of blocking if the child dies
+                try:
+                    rows, elapsed, cpu_time, peak_rss, request = connection.recv()
+                except EOFError:
+                    process.join()
+                    print(f"{name:<16} failed (exit code {process.exitcode})")
+                    continue
+                finally:
+                    connection.close()
+                process.join()
+                p50, p99 = (1000 * (request.get(quantile) or 0) for quantile in ("p50", "p99"))
+                print(f"{name:<16} {rows:>6} {rows / elapsed:>8.1f} {p50:>8.1f} {p99:>8.1f} {cpu_time:>7.2f} {peak_rss / 1024**2:>6.0f} MB")
+    finally:
+        server_connection.send("stop")
+        server_process.join()
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 3 and sys.argv[1] == "record":
+        print(f"{record(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else None)} responses recorded to {sys.argv[2]}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "benchmark":
+        benchmark(sys.argv[2])
+    else:
+        print("Usage: python Replay.py record <archive> [batches] | python Replay.py benchmark <archive>")
@@ -0,0 +1,121 @@
+import threading
+import random
+import time
+
+import Metrics
+
+''' Settings '''
+adaptive = True # Whether to adapt the number of concurrent requests (AIMD). If False, only the thread / connection pools limit it.
+max_requests_per_second = 50.0 # Token bucket: Sustained request rate
+burst = 10 # Token bucket: How many requests may be sent at once after a quiet period
+initial_concurrency = 8 # AIMD: Concurrent requests to start with
+min_concurrency = 1
+max_concurrency = 64 # AIMD: Upper bound. The thread pool (max_workers) / connection pool (max_connections) is a bound as well.
+decrease_factor = 0.5 # AIMD: The limit is multiplied by this on a 429, 5xx, timeout or too high latency
+latency_factor = 3.0 # AIMD: Latency counts as congestion when its average grows beyond this multiple of the best latency seen
+max_retries = 5 # How often a request is retried after a 429, 5xx, timeout or connection error
+backoff_base = 0.5 # Seconds to wait before the first retry, doubled for every further retry (with jitter)
+backoff_cap = 30.0 # Maximum seconds to wait before a retry
+timeout = (5, 30) # Seconds to wait for the connection and for the response
+
+'''
+Request scheduler for the Steam requests (see PageFetcher.py and AsyncScraper.py).
+Every request takes a token from a token bucket, which caps the request rate, and a slot from an
+AIMD-style concurrency limit: The limit doubles every round trip until the first congestion (slow start),
+then grows by about one per round trip while requests succeed and
+is halved (at most once per round trip) when Steam answers with 429 / 5xx, requests time out or the
+latency climbs. Failed requests are retried with jittered exponential backoff, and a Retry-After
+header pauses all requests.
+'''
+
+lock = threading.Lock()
+
+def reset():
+    global tokens, last_refill, paused_until, concurrency_limit, in_flight, best_latency, average_latency, last_decrease, slow_start
+    with lock:
+        tokens = float(burst)
+        last_refill = time.monotonic()
+        paused_until = 0.0
+        concurrency_limit = float(initial_concurrency)
+        in_flight = 0
+        best_latency = None
+        average_latency = None
+        last_decrease = 0.0
+        slow_start = True
+
+reset()
+Metrics.register_gauge("requests_in_flight", lambda: in_flight)
+Metrics.register_gauge("concurrency_limit", lambda: int(concurrency_limit))
+
+def try_acquire():
+    '''
+    Takes a token and a concurrency slot for one request.
+    Returns 0 on success, otherwise the number of seconds to wait before trying again.
+    '''
+    global tokens, last_refill, in_flight
+    with lock:
+        now = time.monotonic()
+        if now < paused_until:
+            return paused_until - now
+        tokens = min(float(burst), tokens + (now - last_refill) * max_requests_per_second)
+        last_refill = now
+        if adaptive and in_flight >= int(concurrency_limit):
+            return 0.01
+        if tokens < 1:
+            return (1 - tokens) / max_requests_per_second
+        tokens -= 1
+        in_flight += 1
+        return 0
+
+def acquire():
+    while True:
+        wait = try_acquire()
+        if wait == 0:
+            return
+        time.sleep(min(wait, 0.1))
+
+def release(status : int, latency : float, retry_after : float = None):
+    '''
+    Gives the slot of a finished request back and adapts the concurrency limit.
+    status is None if the request failed without a response (timeout, connection error).
+    '''
+    global in_flight, concurrency_limit, best_latency, average_latency, last_decrease, paused_until, slow_start
+    with lock:
+        in_flight -= 1
+        now = time.monotonic()
+        if retry_after != None:
+            paused_until = max(paused_until, now + retry_after)
+        if not adaptive:
+            return
+        congested = status == None or is_retryable(status)
+        if not congested:
+            best_latency = latency if best_latency == None else min(best_latency, latency)
+            average_latency = latency if average_latency == None else 0.9 * average_latency + 0.1 * latency
+            congested = average_latency > latency_factor * max(best_latency, 0.001)
+        if congested:
+            if now - last_decrease > (average_latency or 1.0): # Once per round trip, the other failures were caused by the same congestion
+                concurrency_limit = max(float(min_concurrency), concurrency_limit * decrease_factor)
+                last_decrease = now
+                slow_start = False
+        else:
+            concurrency_limit = min(float(max_concurrency), concurrency_limit + (1 if slow_start else 1 / concurrency_limit))
+
+def is_retryable(status : int):
+    return status == 429 or status >= 500
+
+def get_retry_after(headers):
+    '''
+    Returns the Retry-After header in seconds, None if there is none (or it is a date).
+    '''
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt : int, retry_after : float = None):
+    '''
+    Seconds to wait before retry number attempt (starting at 0): Exponential with full jitter,
+    but at least as long as Steam asked for.
+    '''
+    delay = random.uniform(0, min(backoff_cap, backoff_base * 2 ** attempt))
+    return max(delay, retry_after or 0)
@@ -0,0 +1,276 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+import multiprocessing
+import sqlite3
+import socket
+import time
+import csv
+import sys
+import os
+
+import SteamScraper
+import PageFetcher
+import RequestScheduler
+import AppDetails
+
+''' Settings '''
+local_workers = 4 # For the coordinator: How many worker processes to start on this machine
+lease_time = 600 # Seconds a worker may hold a shard. Shards of crashed workers are handed out again after that.
+max_attempts = 3 # A shard that failed this many times is given up (state "failed")
+
+'''
+Sharded scraping for SteamScraper: Every batch offset is a shard, and shards are handed out from a
+work queue in a SQLite file, so any number of worker processes (on this machine or, with the queue
+and shard files on a shared disk that supports file locks, on other machines with their own IP and rate budget)
+can scrape in parallel.
+A worker claims the next pending shard (or one whose lease has expired), scrapes it with max_workers
+threads, writes it to its own csv file in the shard directory and completes it (a shard with games whose page
+failed goes back to the queue until it runs out of attempts, then it is kept with the games it has). The merge step joins
+all completed shards into csv_path and removes duplicate games (a game can show up on two search
+pages if the order changes during the scrape): Every game keeps its first position and gets the values
+of its newest row.
+
+    python ShardedScraper.py coordinator   Creates the queue (or a new run of a merged one), runs local_workers workers and merges
+    python ShardedScraper.py coordinator --fresh   Same, but always starts a new run
+    python ShardedScraper.py worker        Works on the queue of csv_path until it is empty
+    python ShardedScraper.py merge         Merges the completed shards into csv_path
+'''
+
+def get_queue_path(csv_path : str):
+    return os.path.splitext(csv_path)[0] + ".shards.sqlite"
+
+def get_shard_dir(csv_path : str):
+    return os.path.splitext(csv_path)[0] + "_shards"
+
+def get_shard_path(shard_dir : str, offset : int):
+    return os.path.join(shard_dir, f"shard_{offset:06}.csv")
+
+def connect(queue_path : str):
+    connection = sqlite3.connect(queue_path, timeout=60, isolation_level=None) # Transactions are started explicitly
+    connection.execute("PRAGMA journal_mode=WAL")
+    return connection
+
+def create_queue(queue_path : str, batches : int, new_run : bool = False):
+    '''
+    Creates the work queue with one shard per batch offset. Adds missing offsets to an existing
+    queue, so a coordinator can be restarted (or batches raised) without losing finished shards.
+    With new_run, the done and failed shards of the last run are handed out again.
+    '''
+    connection = connect(queue_path)
+    connection.executescript('''
+        CREATE TABLE IF NOT EXISTS shards (offset INTEGER PRIMARY KEY, state TEXT DEFAULT 'pending', worker TEXT,
+                                           lease_expires REAL, attempts INTEGER DEFAULT 0, rows INTEGER, completed REAL);
+        CREATE TABLE IF NOT EXISTS merges (merged REAL);
+    ''')
+    if new_run:
+        connection.execute("UPDATE shards SET state = 'pending', worker = NULL, lease_expires = NULL, attempts = 0, rows = NULL, completed = NULL WHERE state IN ('done', 'failed')")
+    connection.executemany("INSERT OR IGNORE INTO shards (offset) VALUES (?)", [(offset,) for offset in range(0, batches)])
+    connection.close()
+
+def is_merged(queue_path : str):
+    '''
+    Whether the last run of the queue has been merged: No shard is pending or leased and none
+    was completed after the last merge. The next coordinator then starts a new run.
+    '''
+    if not os.path.exists(queue_path):
+        return False
+    connection = connect(queue_path)
+    try:
+        open_shards = connection.execute("SELECT COUNT(*) FROM shards WHERE state IN ('pending', 'leased')").fetchone()[0]
+        last_completed = connection.execute("SELECT MAX(completed) FROM shards WHERE state = 'done'").fetchone()[0]
+        last_merged = connection.execute("SELECT MAX(merged) FROM merges").fetchone()[0]
+    except sqlite3.OperationalError: # A queue from before the merges table
+        return False
+    finally:
+        connection.close()
+    return open_shards == 0 and last_merged != None and (last_completed == None or last_completed <= last_merged)
+
+def claim(connection : sqlite3.Connection, worker_id : str):
+    '''
+    Leases the next pending shard (or one whose lease has expired) to worker_id.
+    A shard whose lease expired after its last attempt is given up (state "failed").
+    Returns its offset, None if there is nothing left to do.
+    '''
+    now = time.time()
+    connection.execute("BEGIN IMMEDIATE") # Locks the queue, so two workers never claim the same shard
+    try:
+        connection.execute("UPDATE shards SET state = 'failed' WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?", (now, max_attempts))
+        row = connection.execute('''SELECT offset FROM shards WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?))
+                                    AND attempts < ? ORDER BY offset LIMIT 1''', (now, max_attempts)).fetchone()
+        if row != None:
+            connection.execute("UPDATE shards SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE offset = ?",
+                               (worker_id, now + lease_time, row[0]))
+        connection.execute("COMMIT")
+    except:
+        connection.execute("ROLLBACK")
+        raise
+    return row[0] if row != None else None
+
+def complete(connection : sqlite3.Connection, worker_id : str, offset : int, rows : int, retry : bool = False):
+    '''
+    Marks a shard as done. With retry (some of its games failed), gives it back to the queue instead, unless it
+    has used up its attempts: Then it is done with the rows it has. Ignored if the lease of worker_id has been
+    taken over by another worker in the meantime. Returns whether the shard is done.
+    '''
+    connection.execute("UPDATE shards SET state = CASE WHEN ? AND attempts < ? THEN 'pending' ELSE 'done' END, rows = ?, completed = ? WHERE offset = ? AND worker = ? AND state = 'leased'",
+                       (retry, max_attempts, rows, time.time(), offset, worker_id))
+    return connection.execute("SELECT state FROM shards WHERE offset = ? AND worker = ?", (offset, worker_id)).fetchone() == ("done",)
+
+def release(connection : sqlite3.Connection, worker_id : str, offset : int):
+    '''
+    Gives a failed shard back to the queue, or gives it up after max_attempts.
+    '''
+    connection.execute("UPDATE shards SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END WHERE offset = ? AND worker = ? AND state = 'leased'",
+                       (max_attempts, offset, worker_id))
+
+def get_status(queue_path : str):
+    connection = connect(queue_path)
+    status = dict(connection.execute("SELECT state, COUNT(*) FROM shards GROUP BY state").fetchall())
+    connection.close()
+    return status
+
+# ----------------------------------------
+
+def apply_settings(settings : dict):
+    '''
+    Overrides settings of the scraper modules in a worker process, e.g. { "store_url" : ..., "use_cache" : False }.
+    '''
+    for (key, value) in settings.items():
+        module = next(m for m in (PageFetcher, RequestScheduler, AppDetails, SteamScraper) if hasattr(m, key))
+        setattr(module, key, value)
+
+def run_worker(queue_path : str, shard_dir : str, worker_id : str = None, settings : dict = {}):
+    '''
+    Claims, scrapes and completes shards until the queue is empty.
+    Returns the number of shards this worker completed.
+    '''
+    apply_settings(settings)
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    os.makedirs(shard_dir, exist_ok=True)
+    connection = connect(queue_path)
+    completed_shards = 0
+    with ThreadPoolExecutor(max_workers=SteamScraper.max_workers) as executor:
+        while True:
+            offset = claim(connection, worker_id)
+            if offset == None:
+                break
+            if SteamScraper.verbose: print(f"[{worker_id}] Scraping shard {offset}")
+            try:
+                game_infos, failed = scrape_shard(offset, executor)
+                write_shard(get_shard_path(shard_dir, offset), game_infos)
+            except Exception as e:
+                if SteamScraper.verbose: print(f"[{worker_id}] Shard {offset} failed: {e}")
+                release(connection, worker_id, offset)
+                continue
+            if failed > 0 and SteamScraper.verbose: print(f"[{worker_id}] Shard {offset}: {failed} games failed")
+            if complete(connection, worker_id, offset, len(game_infos), retry=failed > 0):
+                completed_shards += 1
+    connection.close()
+    return completed_shards
+
+def scrape_shard(offset : int, executor : ThreadPoolExecutor):
+    '''
+    Gets the games of one batch and their data, like one batch of the multithreaded engine.
+    Leaves out the games whose page failed, the shard is retried if it has any (see run_worker).
+    Returns (game_infos, number of failed games).
+    '''
+    game_infos = []
+    SteamScraper.get_games(game_infos, offset)
+    page_infos = SteamScraper.get_app_details(game_infos, executor)
+    futures = [executor.submit(SteamScraper.get_more_data, game_info) for game_info in page_infos]
+    wait(futures)
+    SteamScraper.check_futures(page_infos, futures)
+    fetched_infos = SteamScraper.drop_failed(game_infos)
+    return fetched_infos, len(game_infos) - len(fetched_infos)
+
+def write_shard(shard_path : str, game_infos : list[dict]):
+    '''
+    Writes the rows of a shard in the format of the csv file. Uses a temporary file, so a shard file is
+    either complete or missing, even if the worker dies while writing.
+    '''
+    with open(shard_path + ".tmp", "w", encoding="utf-16") as shard_file:
+        shard_file.write(",".join(SteamScraper.column_names) + "\n")
+        shard_file.write("".join(",".join(SteamScraper.quote(value) for value in SteamScraper.get_row(game_info)) + "\n" for game_info in game_infos))
+    os.replace(shard_path + ".tmp", shard_path)
+
+def merge_shards(queue_path : str, shard_dir : str, csv_path : str):
+    '''
+    Joins the completed shards into csv_path (in the order of their offsets) and removes duplicate games:
+    Every game keeps its first position, but gets the values of the row from the shard completed last.
+    Also writes the Parquet output and the aggregate cubes and records the merged rows in the history
+    (as one snapshot at the time of the merge) if SteamScraper.output_sinks has them.
+    Returns the number of rows.
+    '''
+    connection = connect(queue_path)
+    connection.execute("CREATE TABLE IF NOT EXISTS merges (merged REAL)")
+    merged = time.time() # Before reading, so a shard completed during the merge is not counted as merged
+    shards = connection.execute("SELECT offset, completed FROM shards WHERE state = 'done' ORDER BY offset").fetchall()
+    connection.close()
+    rows = {} # app_id -> row, dicts keep the insertion order of the first row of every game
+    row_completed = {} # app_id -> when the shard of the current row was completed
+    for (offset, completed) in shards:
+        with open(get_shard_path(shard_dir, offset), "r", encoding="utf-16", newline="") as shard_file:
+            reader = csv.reader(shard_file)
+            header = next(reader)
+            app_id_index = header.index("App ID")
+            for row in reader:
+                app_id = row[app_id_index]
+                if app_id not in rows or completed > row_completed[app_id]:
+                    rows[app_id] = row
+                    row_completed[app_id] = completed
+    with open(csv_path + ".tmp", "w", encoding="utf-16", newline="") as csv_file:
+        csv_file.write(",".join(SteamScraper.column_names) + "\n")
+        writer = csv.writer(csv_file, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        writer.writerows(rows.values())
+    os.replace(csv_path + ".tmp", csv_path)
+    if "parquet" in SteamScraper.output_sinks:
+        import OutputSinks # Only here, so the workers do not need pyarrow
+        OutputSinks.csv_to_parquet(csv_path, SteamScraper.output_sinks["parquet"])
+    if "aggregates" in SteamScraper.output_sinks:
+        import Aggregates
+        Aggregates.build(csv_path, SteamScraper.output_sinks["aggregates"])
+    if "history" in SteamScraper.output_sinks:
+        import History
+        history = History.HistorySink(SteamScraper.output_sinks["history"], SteamScraper.column_names, csv_path)
+        history.open(fresh=False)
+        history.write(list(rows.values()))
+        history.close()
+    connection = connect(queue_path)
+    connection.execute("INSERT INTO merges (merged) VALUES (?)", (merged,))
+    connection.close()
+    return len(rows)
+
+def run_coordinator(workers : int = None, settings : dict = {}, fresh : bool = False):
+    '''
+    Creates the work queue for SteamScraper.batches batches, runs worker processes on this machine until
+    every shard is done (or failed) and merges the shards into SteamScraper.csv_path.
+    A queue whose last run has been merged (see is_merged), or any queue with fresh, starts a new run in which
+    every shard is scraped again. Otherwise the coordinator continues the interrupted run.
+    Workers on other machines can join at any time with "python ShardedScraper.py worker".
+    Returns the number of rows.
+    '''
+    apply_settings(settings)
+    csv_path = SteamScraper.csv_path
+    queue_path, shard_dir = get_queue_path(csv_path), get_shard_dir(csv_path)
+    create_queue(queue_path, SteamScraper.batches, new_run=fresh or is_merged(queue_path))
+    context = multiprocessing.get_context("spawn") # The worker processes import the modules fresh, like workers on other machines
+    processes = [context.Process(target=run_worker, args=(queue_path, shard_dir, f"{socket.gethostname()}:local{i}", settings))
+                 for i in range(workers or local_workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    status = get_status(queue_path)
+    if SteamScraper.verbose: print(f"Shards: {status}")
+    return merge_shards(queue_path, shard_dir, csv_path)
+
+if __name__ == '__main__':
+    mode = sys.argv[1] if len(sys.argv) > 1 else "coordinator"
+    if mode == "coordinator":
+        print(f"{run_coordinator(fresh='--fresh' in sys.argv)} rows written to {SteamScraper.csv_path}")
+    elif mode == "worker":
+        create_queue(get_queue_path(SteamScraper.csv_path), SteamScraper.batches)
+        print(f"{run_worker(get_queue_path(SteamScraper.csv_path), get_shard_dir(SteamScraper.csv_path))} shards completed")
+    elif mode == "merge":
+        print(f"{merge_shards(get_queue_path(SteamScraper.csv_path), get_shard_dir(SteamScraper.csv_path), SteamScraper.csv_path)} rows written to {SteamScraper.csv_path}")
+    else:
+        print("Usage: python ShardedScraper.py [coordinator [--fresh] | worker | merge]")
@@ -1,20 +1,42 @@
-import requests
-from concurrent.futures import ThreadPoolExecutor, wait
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed
 from bs4 import BeautifulSoup as bs
 import os
 import json
 import time
+import asyncio
+import csv
+import glob
+import re
 
 import HardwareParser
+import PageFetcher
+import PageExtractor
+import Checkpoint
+import AppDetails
+import Metrics
 
 ''' Settings '''
-csv_path = "SteamData.csv" # (Relative) Path to the output file that is being generated / overwritten
-batches = 256 # How many chunks of games (size ~50) to pull from Steam
+csv_path = "SteamData.csv" # (Relative) Path to the output file that is being generated / updated (see Checkpoint.py)
+batches = 256 # How many chunks of games (size games_per_batch) to pull from Steam
+games_per_batch = 50 # How many games one search page (batch) lists
 multithreaded = True # Whether to use multithreading to speed things up. Disabling multithreading is good for debugging.
 max_workers = 16 # For multithreading: Maximum number of threads to be created within the ThreadPoolExecutor
+multiprocess = False # Whether to download with threads but parse with a pool of processes, so parsing is not limited to one core by the GIL. Takes precedence over multithreaded.
+parse_processes = os.cpu_count() # For multiprocess: Number of parse processes
+parse_chunk_size = 10 # For multiprocess: How many downloaded pages are sent to a parse process at once (fewer round trips, less pickling overhead)
+asynchronous = False # Whether to use the asyncio engine (AsyncScraper.py) instead of threads. Takes precedence over multithreaded.
+max_connections = 32 # For asynchronous: Global limit on concurrent requests (search pages and game pages combined)
+streaming = False # Whether to use the streaming engine (StreamingScraper.py), which writes every row as soon as it is ready and keeps the memory flat. Takes precedence over multiprocess and multithreaded.
+store_url = "https://store.steampowered.com" # Base URL of the Steam store. Can be pointed at a local stub server for benchmarking.
+output_sinks = {} # Additional outputs that are written next to the csv file, e.g. { "parquet" : "SteamData.parquet" } (see OutputSinks.py)
+fast_extractor = True # Whether to parse game pages with the single-pass lxml extractor (PageExtractor.py) instead of BeautifulSoup
+use_appdetails = False # Whether to get the game data from Steam's appdetails API in batches of app IDs (AppDetails.py) and only scrape game pages for what it lacks
 verbose = True # Whether to log stuff to stdout
 
+column_names = ["Name", "Price", "Release date", "Genre 1", "Genre 2", "Rating", "Rating count", "Min OS", "Min OS Version", "Min Processor", "Min Processor Intel", "Min Processor AMD", "Min Graphics", "Min Graphics NVIDIA", "Min Graphics AMD", "Min Memory", "Min Memory MB", "Min Storage", "Min Storage MB", "Rec OS", "Rec OS Version", "Rec Processor", "Rec Processor Intel", "Rec Processor AMD", "Rec Graphics", "Rec Graphics NVIDIA", "Rec Graphics AMD", "Rec Memory", "Rec Memory MB", "Rec Storage", "Rec Storage MB", "App ID"]
+
 def main():
+    Metrics.start_run()
     if verbose:
         start_time = time.time()
         print("\nStarting\n")
@@ -23,74 +45,221 @@ def main():
     prepare_csv_file()
 
     if verbose: print(f"\nGetting games and data [{time.time() - start_time}s]\n")
-    if multithreaded:
+    if asynchronous:
+        '''
+        Process:
+        Search pages and game pages are fetched in one continuous producer / consumer pipeline,
+        see AsyncScraper.py. There is no waiting at batch boundaries.
+        '''
+        import AsyncScraper
+        asyncio.run(AsyncScraper.scrape(batches, max_connections))
+    elif streaming:
+        '''
+        Process:
+        Search pages, downloads (max_workers threads), parsing, hardware normalization and writing are
+        separate stages joined by bounded queues, see StreamingScraper.py. Rows are written as soon as
+        they are ready, and no stage can run ahead of the next one by more than a queue.
+        '''
+        import StreamingScraper
+        StreamingScraper.scrape(batches, max_workers)
+    elif multiprocess:
         '''
         Process:
         1) Get games within this batch by sending a request to Steam (single-threaded)
-        2) Get data for every game within this batch by scraping its Steam page (multithreaded)
+        2) Download the Steam page of every new or stale game within this batch (multithreaded, I/O only)
+        3) As downloads complete, send them in chunks to the process pool, which parses them into rows (multiprocess)
+        4) Wait for all chunks to be parsed
+        5) Append all data from this batch to the csv file and checkpoint the batch
+        6) Repeat for all batches that are not checkpointed yet
+        '''
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, ProcessPoolExecutor(max_workers=parse_processes) as process_pool:
+            for i in range(0, batches):
+                if Checkpoint.is_batch_completed(i):
+                    continue
+                game_infos = [] # List of dicts with all the data for every game
+                if verbose: print(f"\nGetting games in batch {i} [{time.time() - start_time}s]\n")
+                get_games(game_infos, i) # !
+                game_infos = Checkpoint.filter_stale(game_infos)
+                if verbose: print(f"\nGetting data for games in batch {i} [{time.time() - start_time}s]\n")
+                page_infos = get_app_details(game_infos, executor) # !
+                downloads = [executor.submit(download_page, game_info) for game_info in page_infos] # !
+                indexes = { id(game_info) : index for (index, game_info) in enumerate(game_infos) }
+                parse_futures = [] # (future, indexes of its games in game_infos)
+                chunk = []
+                for (done, download) in enumerate(as_completed(downloads), 1):
+                    chunk.append(download.result())
+                    if len(chunk) == parse_chunk_size or done == len(downloads):
+                        parse_futures.append((process_pool.submit(parse_pages, chunk), [indexes[id(game_info)] for (game_info, _) in chunk])) # !
+                        chunk = []
+                for (future, chunk_indexes) in parse_futures:
+                    for (index, game_info) in zip(chunk_indexes, future.result()):
+                        game_infos[index] = game_info # The processes return copies, they take the place of the original, so the topseller order stays
+                if verbose: print(f"\nWriting data to file [{time.time() - start_time}s]\n")
+                write_data_to_csv_file(game_infos)
+                Checkpoint.complete_batch(i, game_infos)
+    elif multithreaded:
+        '''
+        Process:
+        1) Get games within this batch by sending a request to Steam (single-threaded)
+        2) Get data for every new or stale game within this batch by scraping its Steam page (multithreaded)
         3) Wait for all these tasks to complete
-        4) Append all data from this batch to the csv file
-        5) Repeat for all batches
+        4) Append all data from this batch to the csv file and checkpoint the batch
+        5) Repeat for all batches that are not checkpointed yet
         '''
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             for i in range(0, batches):
+                if Checkpoint.is_batch_completed(i):
+                    continue
                 game_infos = [] # List of dicts with all the data for every game
                 futures = [] # To keep track of the progress of the Executor
                 if verbose: print(f"\nGetting games in batch {i} [{time.time() - start_time}s]\n")
                 get_games(game_infos, i) # !
+                game_infos = Checkpoint.filter_stale(game_infos)
                 if verbose: print(f"\nGetting data for games in batch {i} [{time.time() - start_time}s]\n")
-                for game_info in game_infos:
+                page_infos = get_app_details(game_infos, executor) # !
+                for game_info in page_infos:
                     futures.append(executor.submit(get_more_data, game_info)) # !
                 wait(futures) # Wait until this batch is fully processed
+                check_futures(page_infos, futures)
                 if verbose: print(f"\nWriting data to file [{time.time() - start_time}s]\n")
                 write_data_to_csv_file(game_infos)
+                Checkpoint.complete_batch(i, game_infos)
     else:
         '''
         Process:
         1) Get games within this batch by sending a request to Steam
-        2) Get data for every game within this batch by scraping its Steam page
-        3) Append all data from this batch to the csv file
-        4) Repeat for all batches
+        2) Get data for every new or stale game within this batch by scraping its Steam page
+        3) Append all data from this batch to the csv file and checkpoint the batch
+        4) Repeat for all batches that are not checkpointed yet
         '''
         for i in range(0, batches):
+            if Checkpoint.is_batch_completed(i):
+                continue
             game_infos = [] # List of dicts with all the data for every game
             if verbose: print(f"\nGetting games in batch {i} [{time.time() - start_time}s]\n")
             get_games(game_infos, i) # !
+            game_infos = Checkpoint.filter_stale(game_infos)
             if verbose: print(f"\nGetting data for games in batch {i} [{time.time() - start_time}s]\n")
-            for game_info in game_infos:
-                get_more_data(game_info) # !
+            for game_info in get_app_details(game_infos): # !
+                try:
+                    get_more_data(game_info) # !
+                except Exception as e:
+                    mark_failed(game_info, e)
             write_data_to_csv_file(game_infos)
+            Checkpoint.complete_batch(i, game_infos)
+
+    if Checkpoint.has_replaced_rows():
+        if verbose: print(f"\nMerging updated rows into csv file [{time.time() - start_time}s]\n")
+        merge_csv_file()
+    if len(output_sinks) > 0:
+        import OutputSinks
+        OutputSinks.close_sinks()
+    Checkpoint.finish_run()
+    Checkpoint.close()
+    PageFetcher.evict_cache()
+    Metrics.finish_run()
 
-    if verbose: print(f"\nFinished after {time.time() - start_time} seconds\n")
+    if verbose: print(f"\nFinished after {time.time() - start_time} seconds ({PageFetcher.stats_summary()})\n\n{Metrics.summary()}\n")
 
 # ----------------------------------------
 
-def get_games(game_info : dict, offset : int):
+@Metrics.timed
+def get_games(game_infos : list[dict], offset : int):
     '''
     Sends a request to Steam and scrapes the Steam search page to get a batch of games.
     Writes "name" and "url" directly into game_infos.
     '''
-    link = f"https://store.steampowered.com/search/results/?query=&start={offset*50}&count=50&dynamic_data=&sort_by=_ASC&os=win&snr=1_7_7_7000_7&filter=topsellers&infinite=1"
-    listPageRequest = requests.get(link)
-    html = json.loads(listPageRequest.content)["results_html"]
+    content = PageFetcher.fetch(get_search_url(offset))
+    parse_games(game_infos, content)
+
+def get_search_url(offset : int):
+    return f"{store_url}/search/results/?query=&start={offset*games_per_batch}&count={games_per_batch}&dynamic_data=&sort_by=_ASC&os=win&snr=1_7_7_7000_7&filter=topsellers&infinite=1"
+
+@Metrics.timed
+def parse_games(game_infos : list[dict], content : bytes):
+    '''
+    Parses the JSON response of the Steam search page.
+    Writes "name", "url" and "app_id" directly into game_infos.
+    '''
+    html = json.loads(content)["results_html"]
     listPageSoup = bs(html, "lxml")
     gameRows = listPageSoup.find_all("a", {"class" : "search_result_row ds_collapse_flag"})
     for gameRow in gameRows:
         game_name_span = gameRow.find("span", {"class" : "title"})
-        game_info.append( 
-            { "name" : game_name_span.string,
-              "url"  : gameRow["href"] } 
+        game_infos.append( 
+            { "name"   : str(game_name_span.string), # A plain str, a NavigableString keeps the whole search page alive
+              "url"    : gameRow["href"],
+              "app_id" : get_app_id(gameRow["href"]) } 
         )
 
+def get_app_id(url : str):
+    '''
+    Extracts the app ID from the URL of a Steam page ("https://store.steampowered.com/app/<id>/...").
+    Falls back to the whole URL for pages that are not apps (e.g. bundles).
+    '''
+    match = re.search(r"/(app|bundle|sub)/(\d+)", url)
+    if match == None:
+        return url
+    return match.group(2) if match.group(1) == "app" else f"{match.group(1)}/{match.group(2)}"
+
 # ----------------------------------------
+@Metrics.timed
 def get_more_data(game_info : dict):
     '''
     Retrieves much more data about each game in game_info by
     scraping their Steam pages.
+    Writes directly to game_info, but keeps the entries it already has (see get_app_details).
+    '''
+    content = PageFetcher.fetch(game_info["url"])
+    parse_missing_data(game_info, content)
+
+def get_app_details(game_infos : list[dict], executor : ThreadPoolExecutor = None):
+    '''
+    If use_appdetails is enabled, gets the data of game_infos from the appdetails API (see AppDetails.py),
+    one batch of app IDs per request (in the executor, if there is one). Writes directly to game_infos.
+    Returns the games whose Steam page still has to be scraped (all of them if use_appdetails is disabled).
+    '''
+    if not use_appdetails:
+        return game_infos
+    app_batches, page_infos = AppDetails.get_batches(game_infos)
+    for missing in (executor.map(get_app_details_batch, app_batches) if executor != None else map(get_app_details_batch, app_batches)):
+        page_infos.extend(missing)
+    return page_infos
+
+@Metrics.timed
+def get_app_details_batch(game_infos : list[dict]):
+    '''
+    Gets the data of one batch of apps from the appdetails API. Writes directly to game_infos.
+    Returns the games whose Steam page still has to be scraped.
+    '''
+    try:
+        content = PageFetcher.fetch(AppDetails.get_url(store_url, [game_info["app_id"] for game_info in game_infos]))
+    except Exception as e:
+        if verbose: print(f"Failed to get app details, falling back to the game pages: {e}")
+        return game_infos
+    return AppDetails.parse_details(game_infos, content)
+
+def parse_missing_data(game_info : dict, content : bytes):
+    '''
+    Parses a downloaded Steam page of a game, but keeps the entries that game_info already
+    has (e.g. from the appdetails API). Writes directly to game_info.
+    '''
+    page_info = {}
+    parse_more_data(page_info, content)
+    for (key, value) in page_info.items():
+        game_info.setdefault(key, value)
+
+@Metrics.timed
+def parse_more_data(game_info : dict, content : bytes):
+    '''
+    Parses a downloaded Steam page of a game.
     Writes directly to game_info.
     '''
-    game_page_request = requests.get(game_info["url"])
-    game_page_soup = bs(game_page_request.content, "lxml")
+    if fast_extractor:
+        PageExtractor.extract(game_info, content)
+        return
+
+    game_page_soup = bs(content, "lxml")
 
     get_price(game_info, game_page_soup)
     get_release_date(game_info, game_page_soup)
@@ -98,6 +267,74 @@ def get_more_data(game_info : dict):
     get_ratings(game_info, game_page_soup)
     get_genre(game_info, game_page_soup)
 
+def download_page(game_info : dict):
+    '''
+    Only downloads the Steam page of a game, for parsing in another process.
+    Returns game_info and the page (None if the download failed).
+    '''
+    try:
+        return game_info, PageFetcher.fetch(game_info["url"])
+    except Exception as e:
+        mark_failed(game_info, e)
+        return game_info, None
+
+def mark_failed(game_info : dict, error : Exception):
+    '''
+    Flags a game whose page could not be downloaded or parsed. Failed games are neither written
+    nor checkpointed (see write_data_to_csv_file), so they stay stale and the next run tries them again.
+    '''
+    game_info["failed"] = True
+    if verbose: print(f"Failed to get data for {game_info['name']}: {error}")
+
+def check_futures(game_infos : list[dict], futures : list):
+    '''
+    Flags the games whose get_more_data future (same order as game_infos) raised, see mark_failed.
+    '''
+    for (game_info, future) in zip(game_infos, futures):
+        if future.exception() != None:
+            mark_failed(game_info, future.exception())
+
+def drop_failed(game_infos : list[dict]):
+    '''
+    Returns game_infos without the failed games (see mark_failed) and counts those as games_failed_total.
+    '''
+    failed = sum(1 for game_info in game_infos if game_info.get("failed"))
+    if failed == 0:
+        return game_infos
+    Metrics.count("games_failed_total", failed)
+    return [game_info for game_info in game_infos if not game_info.get("failed")]
+
+def parse_pages(pages : list[tuple[dict, bytes]]):
+    '''
+    Runs in a parse process: Parses the downloaded pages and normalizes their hardware.
+    Returns the finished game_infos. A page that cannot be parsed only fails its own game (see mark_failed),
+    the errors of lxml cannot even be sent back to the main process.
+    '''
+    game_infos = []
+    for (game_info, content) in pages:
+        if content != None:
+            try:
+                parse_missing_data(game_info, content)
+                normalize_hardware(game_info)
+            except Exception as e:
+                mark_failed(game_info, e)
+        game_infos.append(game_info)
+    return game_infos
+
+@Metrics.timed
+def normalize_hardware(game_info : dict):
+    '''
+    Parses the free text system requirements into compact values (see HardwareParser.process_sys_reqs),
+    e.g. "Graphics NVIDIA" or "Memory MB". Writes them directly to the system requirements in game_info.
+    Does nothing if that has already happened (e.g. in a parse process).
+    '''
+    for key in ("sys_reqs_min", "sys_reqs_rec"):
+        reqs = game_info.get(key)
+        if reqs == None or "Graphics NVIDIA" in reqs:
+            continue
+        reqs.update(HardwareParser.process_sys_reqs(reqs))
+
+@Metrics.timed
 def get_price(game_info : dict, game_page_soup : bs):
     price_div = game_page_soup.find("div", {"class" : "game_purchase_price price"})
     if price_div != None:
@@ -125,11 +362,13 @@ def get_price(game_info : dict, game_page_soup : bs):
                 price = ""
             game_info["price"] = price
 
+@Metrics.timed
 def get_release_date(game_info : dict, game_page_soup : bs):
     release_date_div = game_page_soup.select_one(".release_date .date")
     if release_date_div != None:
         game_info["release_date"] = release_date_div.string
 
+@Metrics.timed
 def get_sys_reqs(game_info : dict, game_page_soup : bs):
     game_info["sys_reqs_min"] = {"OS" : "", "Processor" : "", "Graphics" : "", "Memory" : "", "Storage" : ""}
     game_info["sys_reqs_rec"] = {"OS" : "", "Processor" : "", "Graphics" : "", "Memory" : "", "Storage" : ""}
@@ -153,6 +392,7 @@ def get_sys_reqs(game_info : dict, game_page_soup : bs):
                 if (len(reqStrs) == 2):
                     game_info["sys_reqs_rec"][reqStrs[0].strip()] = reqStrs[1].strip()
 
+@Metrics.timed
 def get_ratings(game_info : dict, game_page_soup : bs):
     ratings_meta = game_page_soup.find("meta", itemprop="ratingValue")
     if ratings_meta != None:
@@ -161,6 +401,7 @@ def get_ratings(game_info : dict, game_page_soup : bs):
     if ratings_count_meta != None:
         game_info["ratingCount"] = ratings_count_meta["content"]
 
+@Metrics.timed
 def get_genre(game_info : dict, game_page_soup : bs):
     genres_and_manufacturer_div = game_page_soup.find("div", {"id" : "genresAndManufacturer"})
     if genres_and_manufacturer_div != None:
@@ -177,52 +418,110 @@ def get_genre(game_info : dict, game_page_soup : bs):
 
 def prepare_csv_file():
     '''
-    Creates a new file at csv_path and writes the column headers into it
+    Opens the checkpoint store. Keeps the existing file at csv_path if the last run can be
+    resumed or refreshed (and has the same columns), otherwise creates a new file and writes
+    the column headers into it. Opens the other outputs (see OutputSinks.py) as well.
     '''
-    if os.path.exists(csv_path):
-        os.remove(csv_path)
+    if Checkpoint.resume and os.path.exists(csv_path) and os.path.exists(Checkpoint.get_path(csv_path)) and read_csv_header() == column_names:
+        Checkpoint.open_store(csv_path)
+        open_sinks(fresh=False)
+        return
+    for path in (csv_path, Checkpoint.get_path(csv_path), *glob.glob(glob.escape(os.path.splitext(csv_path)[0]) + ".delta-*.csv")):
+        if os.path.exists(path):
+            os.remove(path)
+    Checkpoint.open_store(csv_path)
     with open(csv_path, "w", encoding="utf-16") as csv_file:
-        column_names = ["Name", "Price", "Release date", "Genre 1", "Genre 2", "Rating", "Rating count", "Min OS", "Min Processor", "Min Graphics", "Min Graphics NVIDIA", "Min Graphics AMD", "Min Memory", "Min Storage", "Rec OS", "Rec Processor", "Rec Graphics", "Rec Graphics NVIDIA", "Rec Graphics AMD", "Rec Memory", "Rec Storage"]
         csv_file.write(",".join(column_names) + "\n")
+    open_sinks(fresh=True)
+
+def open_sinks(fresh : bool):
+    '''
+    Opens the outputs in output_sinks. OutputSinks.py (and with it pyarrow) is only imported if there are any.
+    '''
+    if len(output_sinks) > 0:
+        import OutputSinks
+        OutputSinks.open_sinks(output_sinks, column_names, csv_path, fresh)
+
+def read_csv_header():
+    with open(csv_path, "r", encoding="utf-16") as csv_file:
+        return csv_file.readline().rstrip("\n").split(",")
+
+def get_row(game_info : dict):
+    '''
+    Returns the values of all columns (see column_names) for game_info.
+    '''
+    normalize_hardware(game_info)
+    min_reqs = game_info.get("sys_reqs_min", {"OS" : "", "Processor" : "", "Graphics" : "", "Memory" : "", "Storage" : ""})
+    rec_reqs = game_info.get("sys_reqs_rec", {"OS" : "", "Processor" : "", "Graphics" : "", "Memory" : "", "Storage" : ""})
+    return [
+        game_info["name"], game_info.get("price", ""), game_info.get("release_date", ""),
+        game_info.get("genre0", ""), game_info.get("genre1", ""), game_info.get("rating", ""), game_info.get("ratingCount", ""),
+        *get_reqs_row(min_reqs), *get_reqs_row(rec_reqs),
+        game_info.get("app_id", "")
+    ]
 
+def get_reqs_row(reqs : dict):
+    os_version = reqs.get("OS Version", HardwareParser.WindowsVersion.UNKNOWN)
+    memory_mb, storage_mb = reqs.get("Memory MB"), reqs.get("Storage MB")
+    return [
+        reqs.get("OS", ""), os_version.name if os_version != HardwareParser.WindowsVersion.UNKNOWN else "",
+        reqs.get("Processor", ""), reqs.get("Processor Intel", ""), reqs.get("Processor AMD", ""),
+        reqs.get("Graphics", ""), reqs.get("Graphics NVIDIA", ""), reqs.get("Graphics AMD", ""),
+        reqs.get("Memory", ""), str(memory_mb) if memory_mb != None else "",
+        reqs.get("Storage", ""), str(storage_mb) if storage_mb != None else ""
+    ]
+
+@Metrics.timed
 def write_data_to_csv_file(game_infos : list[dict]):
     '''
-    Appends all data within game_infos to the csv.
+    Appends all data within game_infos to the csv and hands the same rows to the other outputs.
     Every dict in game_infos corresponds to one row with the dict entries being the columns.
+    Skips the games whose page failed (see mark_failed), so they do not replace a good row with an empty one.
     '''
+    game_infos = drop_failed(game_infos)
+    rows = [get_row(game_info) for game_info in game_infos]
     with open(csv_path, "a", encoding="utf-16") as csv_file:
-        for game_info in game_infos:
-            name = game_info["name"]
-            price = game_info.get("price", "")
-            release_date = game_info.get("release_date", "")
-            genre0 = game_info.get("genre0", "")
-            genre1 = game_info.get("genre1", "")
-            rating = game_info.get("rating", "")
-            rating_count = game_info.get("ratingCount", "")
-            min_reqs = game_info.get("sys_reqs_min", {"OS" : "", "Processor" : "", "Graphics" : "", "Memory" : "", "Storage" : ""})
-            rec_reqs = game_info.get("sys_reqs_rec", {"OS" : "", "Processor" : "", "Graphics" : "", "Memory" : "", "Storage" : ""})
-            min_graphics_nvidia, min_graphics_amd = "", ""
-            rec_graphics_nvidia, rec_graphics_amd = "", ""
-            if "Graphics" in min_reqs:
-                min_graphics_nvidia, min_graphics_amd = HardwareParser.process_graphics_regex(min_reqs.get("Graphics"))
-            if "Graphics" in rec_reqs:
-                rec_graphics_nvidia, rec_graphics_amd = HardwareParser.process_graphics_regex(rec_reqs.get("Graphics"))
-            reqs = [min_reqs.get("OS", ""), min_reqs.get("Processor", ""), min_reqs.get("Graphics", ""), min_graphics_nvidia, min_graphics_amd, min_reqs.get("Memory", ""), min_reqs.get("Storage", ""), rec_reqs.get("OS", ""), rec_reqs.get("Processor", ""), rec_reqs.get("Graphics", ""), rec_graphics_nvidia, rec_graphics_amd, rec_reqs.get("Memory", ""), rec_reqs.get("Storage", "")]
-            name = name.replace('"', '""')
-            genre0 = genre0.replace('"', '""')
-            genre1 = genre1.replace('"', '""')
-            csv_file.write(f'"{name}"')
-            csv_file.write("," + f'"{price}"')
-            csv_file.write("," + f'"{release_date}"')
-            csv_file.write("," + f'"{genre0}"')
-            csv_file.write("," + f'"{genre1}"')
-            csv_file.write("," + f'"{rating}"')
-            csv_file.write("," + f'"{rating_count}"')
-            for (index, req) in enumerate(reqs):
-                req_escaped = req.replace('"', '""')
-                csv_file.write("," + f'"{req_escaped}"')
-            csv_file.write("\n")
-        csv_file.flush()
+        csv_file.write("".join(",".join(quote(value) for value in row) + "\n" for row in rows))
+    if len(output_sinks) > 0:
+        import OutputSinks
+        OutputSinks.write(rows)
+    if Checkpoint.write_delta:
+        write_delta_file(Checkpoint.detect_changes(rows, len(column_names) - 1))
+
+def write_delta_file(changes : list[tuple[str, list]]):
+    '''
+    Appends the rows of new and changed games to the delta file of this run (see Checkpoint.get_delta_path),
+    in the format of the csv file with an additional first column "Change" ("added" or "changed").
+    '''
+    if len(changes) == 0:
+        return
+    delta_path = Checkpoint.get_delta_path(csv_path)
+    header = "" if os.path.exists(delta_path) else ",".join(["Change"] + column_names) + "\n"
+    with open(delta_path, "a", encoding="utf-16") as delta_file:
+        delta_file.write(header + "".join(",".join(quote(value) for value in [change, *row]) + "\n" for (change, row) in changes))
+
+def quote(value):
+    return '"' + str(value).replace('"', '""') + '"'
+
+@Metrics.timed
+def merge_csv_file():
+    '''
+    Games that were scraped again in this run have been appended to the csv file a second time.
+    Merges those rows into the existing data: Every game keeps its position, but gets the values
+    of its newest row.
+    '''
+    with open(csv_path, "r", encoding="utf-16", newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader)
+        app_id_index = header.index("App ID")
+        rows = {} # app_id -> row, dicts keep the insertion order of the first row of every game
+        for row in reader:
+            rows[row[app_id_index]] = row
+    with open(csv_path + ".tmp", "w", encoding="utf-16", newline="") as csv_file:
+        csv_file.write(",".join(header) + "\n")
+        writer = csv.writer(csv_file, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        writer.writerows(rows.values())
+    os.replace(csv_path + ".tmp", csv_path)
 
 # ----------------------------------------
 
@@ -0,0 +1,198 @@
+import threading
+import queue
+
+import SteamScraper
+import Checkpoint
+import AppDetails
+import Metrics
+
+''' Settings '''
+queue_size = 16 # Maximum number of items waiting between two stages. Bounds the memory: At most this many pages are waiting to be parsed.
+parse_workers = 2 # Threads that parse pages (lxml releases the GIL for most of the parsing)
+write_chunk_size = 50 # Maximum number of rows that are appended to the csv file at once
+open_batches = 4 # Maximum number of batches between the search page and the csv file. Rows are written in topseller order, so the finished games of later batches wait for the earlier ones, at most this many batches of them.
+
+'''
+Streaming engine for SteamScraper (setting streaming).
+Instead of collecting a whole batch before writing it, every game flows through a chain of stages
+that are joined by bounded queues:
+
+    search pages -> fetch -> parse -> normalize hardware -> write
+
+Each stage is a generator function run by one or more threads, and a full queue blocks the stage
+in front of it (backpressure), so the search pages cannot run ahead of the downloads and the downloads
+cannot run ahead of the parsers. A row is written as soon as its game and all games in front of it
+(in topseller order, like the other engines) are done, and at most open_batches batches are between the
+search page and the csv file, so the memory stays flat no matter how many batches are scraped.
+Written games are checkpointed right away (Checkpoint.complete_apps) and a batch is completed when
+its last game is written.
+'''
+
+stop = object() # Sent through a queue to stop one worker of the next stage
+
+def scrape(batches : int, max_workers : int):
+    search_queue = queue.Queue()
+    fetch_queue, parse_queue, normalize_queue, write_queue = (queue.Queue(maxsize=queue_size) for _ in range(4))
+    pending_batches = {} # offset -> [game_infos in topseller order, ids of the finished ones, number written], in offset order
+    pending_lock = threading.Lock()
+    batch_slots = threading.Semaphore(open_batches)
+    errors = []
+
+    for (stage, stage_queue) in (("search", search_queue), ("fetch", fetch_queue), ("parse", parse_queue), ("normalize", normalize_queue), ("write", write_queue)):
+        Metrics.register_gauge("queue_depth", stage_queue.qsize, stage=stage)
+
+    for offset in range(0, batches):
+        search_queue.put(offset)
+    search_queue.put(stop)
+    stages = [
+        (start_stage(lambda offset: search_games(offset, pending_batches, pending_lock, batch_slots, errors), search_queue, fetch_queue, 1, errors), fetch_queue, max_workers),
+        (start_stage(fetch_pages, fetch_queue, parse_queue, max_workers, errors), parse_queue, parse_workers),
+        (start_stage(parse_pages, parse_queue, normalize_queue, parse_workers, errors), normalize_queue, 1),
+        (start_stage(normalize_hardware, normalize_queue, write_queue, 1, errors), write_queue, 1),
+    ]
+    writer = threading.Thread(target=write_rows, args=(write_queue, pending_batches, pending_lock, batch_slots, errors), daemon=True)
+    writer.start()
+    for (threads, next_queue, next_workers) in stages:
+        for thread in threads:
+            thread.join()
+        for _ in range(next_workers):
+            next_queue.put(stop)
+    writer.join()
+    Metrics.remove_gauges("queue_depth")
+    if len(errors) > 0:
+        raise errors[0]
+
+def start_stage(work, in_queue : queue.Queue, out_queue : queue.Queue, workers : int, errors : list):
+    '''
+    Starts workers threads that put everything work(item) yields for the items of in_queue into out_queue.
+    A worker stops at the first stop it gets. Errors are collected in errors and do not stop the stage,
+    otherwise the stages in front of it would block forever. The errors of a single game are handled by the
+    stages themselves (see parse_pages), anything that ends up here fails the run.
+    '''
+    def worker():
+        while True:
+            item = in_queue.get()
+            if item is stop:
+                return
+            try:
+                for result in work(item):
+                    out_queue.put(result)
+            except Exception as e:
+                errors.append(e)
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+# ----------------------------------------
+
+def search_games(offset : int, pending_batches : dict, pending_lock : threading.Lock, batch_slots : threading.Semaphore, errors : list):
+    '''
+    Gets the games of one search page. Yields the new or stale ones (or batches of them for the
+    appdetails API) as (offset, game_info or list of game_infos), once there are fewer than open_batches
+    batches that are not written yet.
+    '''
+    if Checkpoint.is_batch_completed(offset):
+        return
+    game_infos = []
+    if SteamScraper.verbose: print(f"Getting games in batch {offset}")
+    SteamScraper.get_games(game_infos, offset)
+    game_infos = Checkpoint.filter_stale(game_infos)
+    if len(game_infos) == 0:
+        Checkpoint.complete_batch(offset, game_infos)
+        return
+    while not batch_slots.acquire(timeout=1):
+        if len(errors) > 0: # A game of an open batch got lost, it will never be written
+            raise RuntimeError(f"Stopped before batch {offset} after an error")
+    with pending_lock:
+        pending_batches[offset] = [game_infos, set(), 0]
+    if SteamScraper.use_appdetails:
+        app_batches, game_infos = AppDetails.get_batches(game_infos)
+        for app_batch in app_batches:
+            yield (offset, app_batch)
+    for game_info in game_infos:
+        yield (offset, game_info)
+
+def fetch_pages(item : tuple):
+    '''
+    Downloads the page of a game (or the app details of a batch of games, and the pages they still need).
+    Yields (offset, game_info, page), the page is None if there is nothing (more) to parse.
+    '''
+    offset, game_info = item
+    if isinstance(game_info, list):
+        missing = SteamScraper.get_app_details_batch(game_info)
+        missing_ids = set(map(id, missing))
+        for complete_info in game_info:
+            if id(complete_info) not in missing_ids:
+                yield (offset, complete_info, None)
+        for missing_info in missing:
+            yield (offset, *SteamScraper.download_page(missing_info))
+        return
+    yield (offset, *SteamScraper.download_page(game_info))
+
+def parse_pages(item : tuple):
+    '''
+    Parses the page of a game. A page that cannot be parsed fails only its game (see SteamScraper.mark_failed),
+    which is still passed on, so its batch gets completed.
+    '''
+    offset, game_info, content = item
+    if content != None:
+        try:
+            SteamScraper.parse_missing_data(game_info, content)
+        except Exception as e:
+            SteamScraper.mark_failed(game_info, e)
+    yield (offset, game_info)
+
+def normalize_hardware(item : tuple):
+    game_info = item[1]
+    if not game_info.get("failed"):
+        try:
+            SteamScraper.normalize_hardware(game_info)
+        except Exception as e:
+            SteamScraper.mark_failed(game_info, e)
+    yield item
+
+def write_rows(write_queue : queue.Queue, pending_batches : dict, pending_lock : threading.Lock, batch_slots : threading.Semaphore, errors : list):
+    '''
+    Appends finished games to the csv file as they arrive, up to write_chunk_size at once, but in topseller order:
+    A game waits until the games in front of it are written. Checkpoints the written games and completes every
+    batch whose last game has been written.
+    '''
+    done = False
+    while not done:
+        items = [write_queue.get()]
+        while len(items) < write_chunk_size:
+            try:
+                items.append(write_queue.get_nowait())
+            except queue.Empty:
+                break
+        done = any(item is stop for item in items)
+        items = [item for item in items if item is not stop]
+        if len(items) == 0:
+            continue
+        try:
+            game_infos = [] # Games that can be written now, in order
+            completed = []
+            with pending_lock:
+                for (offset, game_info) in items:
+                    pending_batches[offset][1].add(id(game_info))
+                while len(pending_batches) > 0:
+                    offset, batch = next(iter(pending_batches.items()))
+                    batch_infos, finished, written = batch
+                    while written < len(batch_infos) and id(batch_infos[written]) in finished:
+                        game_infos.append(batch_infos[written])
+                        written += 1
+                    batch[2] = written
+                    if written < len(batch_infos):
+                        break
+                    del pending_batches[offset]
+                    completed.append(offset)
+            if len(game_infos) > 0:
+                SteamScraper.write_data_to_csv_file(game_infos)
+                Checkpoint.complete_apps(game_infos)
+            for offset in completed:
+                if SteamScraper.verbose: print(f"Batch {offset} written")
+                Checkpoint.complete_batch(offset, [])
+                batch_slots.release()
+        except Exception as e:
+            errors.append(e)
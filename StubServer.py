@@ -0,0 +1,213 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import threading
+import hashlib
+import random
+import json
+import time
+
+''' Settings '''
+games_total = 1000 # How many games the stub store pretends to have
+latency = 0.05 # Seconds every response is delayed by, to simulate the network
+page_padding = 200 # How many filler blocks (~1KB each) to put into every game page, Steam pages are big
+etags = True # Whether game pages carry an ETag and conditional requests are answered with 304
+capacity = None # Fault injection: Answer with 429 (Retry-After: 1) while more than this many requests are in flight. None for no limit.
+error_rate = 0.0 # Fault injection: Share of requests that are answered with a random 500 / 502 / 503
+hang_rate = 0.0 # Fault injection: Share of requests that hang for hang_time seconds, so that the client times out
+hang_time = 60
+ranking_shift = 0 # Simulates a ranking that shifts while the scraper pages through it: Every search page starts this many games earlier than the one before, so they show up twice
+price_change = 0 # Added to the price (in euros) of every tenth game, to simulate price changes between two runs
+fixtures = None # Recorded responses to serve instead of the generated pages, { path with query : (content type, body) } (see Replay.py)
+
+'''
+A small local imitation of store.steampowered.com, serving search result pages, game pages and
+the appdetails API in the same structure as the real store. Used to benchmark the scraper without hitting Steam.
+'''
+
+def search_results_json(base_url : str, start : int, count : int):
+    rows = []
+    start = max(0, start - ranking_shift * (start // count))
+    for app_id in range(start, min(start + count, games_total)):
+        rows.append(f'<a href="{base_url}/app/{app_id}/" class="search_result_row ds_collapse_flag"><span class="title">Game {app_id}</span></a>')
+    return json.dumps({ "results_html" : "\n".join(rows) })
+
+def game_page_html(app_id : int):
+    '''
+    A game page in the structure of the real store. Depending on app_id, some pages are free to play,
+    discounted, have only one genre or lack ratings / system requirements, like on Steam.
+    '''
+    filler = '<div class="filler"><p>' + "Lorem ipsum dolor sit amet. " * 36 + "</p></div>\n"
+    variant = app_id % 7
+    ratings = f'''<meta itemprop="ratingValue" content="{app_id % 10 + 1}">
+<meta itemprop="reviewCount" content="{app_id * 7}">''' if variant != 4 else ""
+    if variant == 0:
+        price = '<div class="game_purchase_price price" data-price-final="0">\n\t\t\tFree to Play\t\t</div>'
+    elif variant == 1:
+        price = f'<div class="discount_block game_purchase_discount"><div class="discount_pct">-50%</div><div class="discount_prices"><div class="discount_original_price">{get_base_price(app_id)},99€</div><div class="discount_final_price">{app_id % 30},49€</div></div></div>'
+    else:
+        price = f'<div class="game_purchase_price price">\n\t\t\t{get_base_price(app_id)},99€\t\t</div>'
+    genres = '<a href="/genre/Action/">Action</a>, <a href="/genre/Indie/">Indie</a>' if variant != 3 else '<a href="/genre/RPG/">RPG</a>'
+    min_reqs, rec_reqs = sys_req_items(app_id)
+    sys_reqs = f'''<div class="game_area_sys_req sysreq_content active" data-os="win">
+<div class="game_area_sys_req_leftCol"><ul><strong>MINIMUM:</strong><br><ul class="bb_ul">
+{min_reqs}
+</ul></ul></div>
+<div class="game_area_sys_req_rightCol"><ul><strong>RECOMMENDED:</strong><br><ul class="bb_ul">
+{rec_reqs}
+</ul></ul></div>
+</div>''' if variant != 2 else ""
+    return f'''<html><head>
+<meta http-equiv="Content-Type" content="text/html; charset=UTF-8">
+<title>Game {app_id} on Steam</title>
+{ratings}
+</head><body>
+{filler * (page_padding // 2)}
+<div class="game_area_purchase_game_wrapper"><div class="game_purchase_action"><div class="game_purchase_action_bg">
+{price}
+</div></div></div>
+<div class="release_date"><div class="subtitle column">Release Date:</div><div class="date">{app_id % 28 + 1} Jan, 20{app_id % 23:02}</div></div>
+<div id="genresAndManufacturer" class="details_block"><b>Title:</b> Game {app_id}<br><b>Genre:</b> <span data-panel="{{&quot;flow-children&quot;:&quot;row&quot;}}">{genres}</span><br></div>
+{sys_reqs}
+{filler * (page_padding - page_padding // 2)}
+</body></html>'''
+
+def get_base_price(app_id : int):
+    return app_id % 60 + (price_change if app_id % 10 == 0 else 0)
+
+def sys_req_items(app_id : int):
+    '''
+    The list items of the minimum and recommended system requirements, as on the game page and in appdetails.
+    '''
+    min_reqs = f'''<li><strong>OS:</strong> Windows 10 64 bit<br></li>
+<li><strong>Processor:</strong> Intel Core i5-4590<br></li>
+<li><strong>Memory:</strong> 8 GB RAM<br></li>
+<li><strong>Graphics:</strong> NVIDIA GeForce GTX 960 or AMD Radeon RX 470<br></li>
+<li><strong>Storage:</strong> {app_id % 90 + 10} GB available space</li>'''
+    rec_reqs = f'''<li><strong>OS:</strong> Windows 10 64 bit<br></li>
+<li><strong>Processor:</strong> Intel Core i7-8700<br></li>
+<li><strong>Memory:</strong> 16 GB RAM<br></li>
+<li><strong>Graphics:</strong> NVIDIA GeForce RTX 2070 SUPER or AMD Radeon RX 5700 XT<br></li>
+<li><strong>Storage:</strong> {app_id % 90 + 10} GB available space<br></li>
+<li><strong>Additional Notes:</strong> Requires a 64-bit processor: SSE 4.2</li>'''
+    return min_reqs, rec_reqs
+
+def app_details_json(app_ids : list[int]):
+    '''
+    The response of the appdetails API for app_ids, with the same data as game_page_html
+    (no ratings, the API does not have them). Unknown app IDs get "success": false like on Steam.
+    '''
+    details = {}
+    for app_id in app_ids:
+        if app_id >= games_total:
+            details[str(app_id)] = { "success" : False }
+            continue
+        variant = app_id % 7
+        data = {
+            "type" : "game", "name" : f"Game {app_id}", "steam_appid" : app_id, "is_free" : variant == 0,
+            "short_description" : "Lorem ipsum dolor sit amet. " * 8,
+            "detailed_description" : ("<p>" + "Lorem ipsum dolor sit amet. " * 36 + "</p>") * (page_padding // 20), # Steam sends the whole "About this game" text
+            "release_date" : { "coming_soon" : False, "date" : f"{app_id % 28 + 1} Jan, 20{app_id % 23:02}" },
+            "genres" : [{ "id" : "3", "description" : "RPG" }] if variant == 3 else [{ "id" : "1", "description" : "Action" }, { "id" : "23", "description" : "Indie" }],
+        }
+        if variant != 0:
+            initial = get_base_price(app_id) * 100 + 99
+            final = (app_id % 30) * 100 + 49 if variant == 1 else initial
+            data["price_overview"] = { "currency" : "EUR", "initial" : initial, "final" : final, "discount_percent" : 50 if variant == 1 else 0,
+                                       "initial_formatted" : f"{initial // 100},{initial % 100:02}€" if variant == 1 else "", "final_formatted" : f"{final // 100},{final % 100:02}€" }
+        if variant == 2:
+            data["pc_requirements"] = []
+        else:
+            min_reqs, rec_reqs = sys_req_items(app_id)
+            data["pc_requirements"] = { "minimum" : f'<strong>Minimum:</strong><br><ul class="bb_ul">{min_reqs}</ul>',
+                                        "recommended" : f'<strong>Recommended:</strong><br><ul class="bb_ul">{rec_reqs}</ul>' }
+        details[str(app_id)] = { "success" : True, "data" : data }
+    return json.dumps(details)
+
+in_flight = 0
+in_flight_lock = threading.Lock()
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so connection pooling on the client side actually does something
+
+    def do_GET(self):
+        global in_flight
+        with in_flight_lock:
+            in_flight += 1
+            overloaded = capacity != None and in_flight > capacity
+        try:
+            if overloaded:
+                self.respond(429, "text/plain", "Too Many Requests", { "Retry-After" : "1" })
+            elif random.random() < error_rate:
+                self.respond(random.choice([500, 502, 503]), "text/plain", "Server error")
+            elif random.random() < hang_rate:
+                time.sleep(hang_time)
+            else:
+                self.do_GET_page()
+        finally:
+            with in_flight_lock:
+                in_flight -= 1
+
+    def do_GET_page(self):
+        time.sleep(latency * (1 + max(0, in_flight - (capacity or in_flight)) / (capacity or 1))) # Like a real server, it gets slower under load
+        url = urlparse(self.path)
+        if fixtures != None:
+            fixture = fixtures.get(self.path)
+            if fixture == None:
+                self.respond(404, "text/plain", "Not recorded")
+            else:
+                self.respond_page(*fixture)
+        elif url.path.startswith("/search/results"):
+            query = parse_qs(url.query)
+            body = search_results_json(f"http://{self.headers['Host']}", int(query["start"][0]), int(query["count"][0]))
+            self.respond(200, "application/json", body)
+        elif url.path.startswith("/api/appdetails"):
+            query = parse_qs(url.query)
+            body = app_details_json([int(app_id) for app_id in query["appids"][0].split(",")])
+            self.respond(200, "application/json", body)
+        elif url.path.startswith("/app/"):
+            app_id = int(url.path.split("/")[2])
+            self.respond_page("text/html; charset=utf-8", game_page_html(app_id))
+        else:
+            self.respond(404, "text/plain", "Not found")
+
+    def respond_page(self, content_type : str, body):
+        '''
+        Responds with a game page, with an ETag and a 304 for conditional requests if etags is enabled.
+        '''
+        if not etags:
+            self.respond(200, content_type, body)
+            return
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.respond(304, content_type, "", { "ETag" : etag })
+        else:
+            self.respond(200, content_type, data, { "ETag" : etag })
+
+    def respond(self, status : int, content_type : str, body, headers : dict = {}):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for (name, value) in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # Silence the per-request logging of http.server
+
+def start():
+    '''
+    Starts the stub server on a free local port in a background thread.
+    Returns the server (call shutdown() on it when done) and its base URL.
+    '''
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == '__main__':
+    server, base_url = start()
+    print(f"Stub Steam store running at {base_url}")
+    threading.Event().wait()